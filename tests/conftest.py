@@ -27,6 +27,8 @@ from django.utils.version import get_version
 
 assert get_version() < '3.0.0', 'Пожалуйста, используйте версию Django < 3.0.0'
 
+import pytest
+
 from yatube.settings import INSTALLED_APPS
 
 assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts']), (
@@ -37,3 +39,11 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_settings():
+    """Те же настройки, что у `manage.py test`: pytest не берёт TEST_RUNNER."""
+    from core.test_runner import isolated_settings
+    with isolated_settings():
+        yield
@@ -0,0 +1,41 @@
+import os
+import sqlite3
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+
+pytestmark = [pytest.mark.django_db]
+
+
+def shared_cache_state():
+    path = settings.CACHE_BACKENDS['sqlite']['LOCATION']
+    if not os.path.exists(path):
+        return None
+    # Отдельное соединение видит и записи из WAL-журнала
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return connection.execute(
+            'SELECT key, expires FROM cache_entry ORDER BY key').fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        connection.close()
+
+
+class TestIsolation:
+
+    def test_shared_cache_untouched(self, client, post_with_group):
+        before = shared_cache_state()
+        cache.clear()
+        response = client.get('/')
+        assert response.status_code == 200
+        response = client.get(f'/group/{post_with_group.group.slug}/')
+        assert response.status_code == 200
+        assert shared_cache_state() == before, (
+            'Тесты не должны писать в общий файл кеша разработчика'
+        )
+
+    def test_tasks_run_without_worker(self):
+        assert settings.TASKS_EAGER, 'Задачи в тестах выполняются без воркера'
+        assert settings.DATABASE_REPLICAS == []
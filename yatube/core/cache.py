@@ -0,0 +1,275 @@
+"""Общий для всех процессов кеш и защита от лавины пересчётов.
+
+`SQLiteCache` хранит записи в одном файле SQLite, поэтому воркеры WSGI
+видят один и тот же кеш. Интерфейс — стандартный `BaseCache`, так что
+на проде бэкенд меняется на Redis одной настройкой. `MeteredCache`
+оборачивает любой из бэкендов и считает попадания для метрик запроса.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+from .metrics import record_cache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entry ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+    'compressed INTEGER NOT NULL, expires REAL)'
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite со сжатием больших значений."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._compress_min_length = int(
+            options.get('COMPRESS_MIN_LENGTH', 1024))
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=10,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _expiry(self, timeout):
+        # get_backend_timeout уже возвращает момент истечения
+        return self.get_backend_timeout(timeout)
+
+    def _dump(self, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self._compress_min_length:
+            return zlib.compress(data), 1
+        return data, 0
+
+    @staticmethod
+    def _load(data, compressed):
+        if compressed:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def _read(self, keys):
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connection.execute(
+            f'SELECT key, value, compressed FROM cache_entry '
+            f'WHERE key IN ({placeholders}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            [*keys, time.time()]
+        ).fetchall()
+        return {key: self._load(value, compressed)
+                for key, value, compressed in rows}
+
+    def _write(self, key, value, timeout, only_new=False):
+        data, compressed = self._dump(value)
+        connection = self._connection
+        if only_new:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute(
+                    'DELETE FROM cache_entry WHERE key = ? '
+                    'AND expires IS NOT NULL AND expires <= ?',
+                    [key, time.time()]
+                )
+                inserted = connection.execute(
+                    'INSERT OR IGNORE INTO cache_entry VALUES (?, ?, ?, ?)',
+                    [key, data, compressed, self._expiry(timeout)]
+                ).rowcount
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        else:
+            connection.execute(
+                'INSERT OR REPLACE INTO cache_entry VALUES (?, ?, ?, ?)',
+                [key, data, compressed, self._expiry(timeout)]
+            )
+            inserted = 1
+        self._writes += 1
+        if self._writes % self._cull_every == 0:
+            self._cull()
+        return bool(inserted)
+
+    def _cull(self):
+        connection = self._connection
+        connection.execute(
+            'DELETE FROM cache_entry WHERE expires IS NOT NULL '
+            'AND expires <= ?', [time.time()]
+        )
+        count = connection.execute(
+            'SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key IN ('
+                'SELECT key FROM cache_entry '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                [count // self._cull_frequency]
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._write(key, value, timeout, only_new=True)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        made_keys = {self.make_key(key, version=version): key
+                     for key in keys}
+        for key in made_keys:
+            self.validate_key(key)
+        found = self._read(list(made_keys))
+        return {made_keys[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(self._connection.execute(
+            'UPDATE cache_entry SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self._expiry(timeout), key, time.time()]
+        ).rowcount)
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection.execute(
+            'DELETE FROM cache_entry WHERE key = ?', [key])
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key in self._read([key])
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value, compressed, expires FROM cache_entry '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                [key, time.time()]
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._load(row[0], row[1]) + delta
+            data, compressed = self._dump(value)
+            connection.execute(
+                'UPDATE cache_entry SET value = ?, compressed = ? '
+                'WHERE key = ?', [data, compressed, key]
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache_entry')
+
+    def close(self, **kwargs):
+        # Соединение живёт в потоке воркера и переиспользуется запросами
+        pass
+
+
+class MeteredCache:
+    """Любой бэкенд кеша со счётчиком попаданий и промахов.
+
+    Бэкенд задаётся ключом METERED_BACKEND в настройках кеша, остальные
+    параметры передаются ему как есть. Чтения считаются здесь, а не в
+    бэкенде, поэтому Server-Timing и /performance/ одинаково честны для
+    SQLite, Redis, файлов и памяти процесса.
+    """
+    _missing = object()
+
+    def __init__(self, location, params):
+        params = dict(params)
+        backend = import_string(params.pop('METERED_BACKEND'))
+        self._cache = backend(location, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def __contains__(self, key):
+        return self.has_key(key)
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, self._missing, version=version)
+        if value is self._missing:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._cache.get_many(keys, version=version)
+        record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+def get_or_compute(key, compute, timeout, cacheable=None,
+                   cache=default_cache, early=0.1, lock_timeout=10,
+                   wait=1.0):
+    """Значение из кеша с защитой от лавины пересчётов.
+
+    Пересчитывает значение только один процесс, взявший блокировку.
+    За долю `early` до истечения TTL один из запросов обновляет запись
+    заранее, остальные продолжают получать старое значение. При пустом
+    кеше остальные ждут до `wait` секунд, пока значение не появится.
+    """
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None:
+        value, refresh_at = entry
+        if time.time() < refresh_at or not cache.add(lock_key, 1,
+                                                     lock_timeout):
+            return value
+    elif not cache.add(lock_key, 1, lock_timeout):
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return compute()
+    try:
+        value = compute()
+        if cacheable is None or cacheable(value):
+            refresh_at = time.time() + timeout * (1 - early)
+            cache.set(key, (value, refresh_at), timeout)
+    finally:
+        cache.delete(lock_key)
+    return value
@@ -0,0 +1,57 @@
+import json
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.tasks import (claim, execute, prune_done, queue_stats,
+                        requeue_stale)
+
+# Через сколько циклов воркер чистит старые задачи и зависшие захваты
+MAINTENANCE_EVERY = 100
+
+
+class Command(BaseCommand):
+    help = ('Воркер фоновой очереди: выполняет задачи из базы. '
+            'Для нескольких воркеров запустите несколько процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=10,
+                            help='сколько задач забирать за раз')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='пауза при пустой очереди, секунд')
+        parser.add_argument('--once', action='store_true',
+                            help='выполнить готовые задачи и выйти')
+        parser.add_argument('--stats', action='store_true',
+                            help='напечатать состояние очереди и выйти')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(queue_stats(), ensure_ascii=False,
+                                         indent=2))
+            return
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        cycle = 0
+        done = failed = 0
+        try:
+            while True:
+                if cycle % MAINTENANCE_EVERY == 0:
+                    requeue_stale()
+                    prune_done()
+                cycle += 1
+                close_old_connections()
+                tasks = claim(worker, options['batch'])
+                for task in tasks:
+                    if execute(task):
+                        done += 1
+                    else:
+                        failed += 1
+                if not tasks:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f'{worker}: выполнено {done}, с ошибкой {failed}')
@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def copy_database(source, target):
+    """Копирует файл SQLite через backup API, не блокируя запись."""
+    primary = sqlite3.connect(source)
+    replica = sqlite3.connect(target)
+    try:
+        primary.backup(replica)
+    finally:
+        replica.close()
+        primary.close()
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик; с --interval '
+            'повторяет копирование, имитируя отставание репликации')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='секунд между копированиями')
+
+    def handle(self, *args, **options):
+        primary = connections['default'].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Команда копирует только базы SQLite')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: задайте '
+                               'YATUBE_DB_REPLICAS')
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                replica = connections[alias].settings_dict['NAME']
+                copy_database(primary['NAME'], replica)
+                self.stdout.write(f'{alias}: {replica}')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,219 @@
+"""Метрики запросов: SQL, шаблоны, кеш и гистограммы по вьюхам.
+
+Метрики текущего запроса живут в thread-local и пополняются из обёртки
+курсора, бэкенда шаблонов и `MeteredCache`. Итоги копятся в памяти
+процесса и раз в PERFORMANCE_FLUSH_SECONDS сбрасываются в общий кеш,
+откуда страница статистики собирает данные всех воркеров.
+"""
+import copy
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Верхние границы корзин гистограмм; последняя корзина — всё, что больше
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Счётчики одного запроса."""
+    __slots__ = ('request', 'started', 'sql_count', 'sql_time',
+                 'template_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self, request=None):
+        self.request = request
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start_request(request=None):
+    _local.metrics = RequestMetrics(request)
+    return _local.metrics
+
+
+def finish_request():
+    _local.metrics = None
+
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+def current_view():
+    """Имя вьюхи текущего запроса или None вне запроса."""
+    metrics = current()
+    if metrics is None:
+        return None
+    match = getattr(metrics.request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+def record_template(seconds):
+    metrics = current()
+    if metrics is not None:
+        metrics.template_time += seconds
+
+
+def record_cache(hits, misses):
+    metrics = current()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """Обёртка курсора для connection.execute_wrapper."""
+    metrics = current()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_count += 1
+        metrics.sql_time += time.perf_counter() - started
+
+
+def bucket(value, bounds):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+def empty_stats():
+    return {
+        'requests': 0,
+        'errors': 0,
+        'total_ms': 0.0,
+        'sql_ms': 0.0,
+        'template_ms': 0.0,
+        'sql_count': 0,
+        'cache_hits': 0,
+        'cache_misses': 0,
+        'latency_histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        'query_histogram': [0] * (len(QUERY_BUCKETS) + 1),
+    }
+
+
+def merge_stats(target, source):
+    """Складывает итоги двух воркеров: числа, списки и вложенные словари.
+
+    Строки берутся из первого источника, ключи `max_*` — по максимуму.
+    """
+    for key, value in source.items():
+        if key not in target:
+            target[key] = copy.deepcopy(value)
+        elif isinstance(value, dict):
+            merge_stats(target[key], value)
+        elif isinstance(value, list):
+            target[key] = [a + b for a, b in zip(target[key], value)]
+        elif isinstance(value, str):
+            continue
+        elif key.startswith('max_'):
+            target[key] = max(target[key], value)
+        else:
+            target[key] += value
+    return target
+
+
+class SharedStats:
+    """Итоги в памяти процесса, которые периодически уходят в общий кеш.
+
+    Каждый воркер пишет свой снимок под ключом `<prefix>:<pid>`,
+    `collect()` складывает снимки всех воркеров.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._data = {}
+        self._flushed_at = time.monotonic()
+
+    def _flush_if_due(self):
+        if (time.monotonic() - self._flushed_at
+                >= settings.PERFORMANCE_FLUSH_SECONDS):
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+    def flush(self):
+        """Кладёт итоги процесса в общий кеш под ключом его pid."""
+        self._flushed_at = time.monotonic()
+        timeout = settings.PERFORMANCE_STATS_TTL
+        pid = os.getpid()
+        workers_key = f'{self.prefix}:workers'
+        cache.set(f'{self.prefix}:{pid}', self.snapshot(), timeout)
+        workers = set(cache.get(workers_key, ()))
+        if pid not in workers:
+            cache.set(workers_key, workers | {pid}, timeout)
+
+    def collect(self):
+        """Итоги всех воркеров и число воркеров, приславших снимок."""
+        self.flush()
+        workers = cache.get(f'{self.prefix}:workers', set())
+        snapshots = cache.get_many(
+            [f'{self.prefix}:{pid}' for pid in workers])
+        merged = {}
+        for snapshot in snapshots.values():
+            merge_stats(merged, snapshot)
+        return merged, len(snapshots)
+
+    def reset(self):
+        with self._lock:
+            self._data = {}
+
+
+class ViewStats(SharedStats):
+    """Итоги запросов по имени вьюхи."""
+
+    def add(self, view_name, metrics, status_code):
+        total_ms = metrics.elapsed * 1000
+        with self._lock:
+            stats = self._data.setdefault(view_name, empty_stats())
+            stats['requests'] += 1
+            stats['errors'] += status_code >= 500
+            stats['total_ms'] += total_ms
+            stats['sql_ms'] += metrics.sql_time * 1000
+            stats['template_ms'] += metrics.template_time * 1000
+            stats['sql_count'] += metrics.sql_count
+            stats['cache_hits'] += metrics.cache_hits
+            stats['cache_misses'] += metrics.cache_misses
+            stats['latency_histogram'][
+                bucket(total_ms, LATENCY_BUCKETS_MS)] += 1
+            stats['query_histogram'][
+                bucket(metrics.sql_count, QUERY_BUCKETS)] += 1
+        self._flush_if_due()
+
+
+aggregator = ViewStats('performance')
+
+
+def collected_stats():
+    """Итоги всех воркеров, сброшенные в кеш, с гистограммами."""
+    views, workers = aggregator.collect()
+    for stats in views.values():
+        requests = stats['requests'] or 1
+        stats['mean_ms'] = round(stats['total_ms'] / requests, 3)
+        stats['mean_sql_count'] = round(stats['sql_count'] / requests, 2)
+    return {
+        'workers': workers,
+        'latency_buckets_ms': LATENCY_BUCKETS_MS,
+        'query_buckets': QUERY_BUCKETS,
+        'views': views,
+    }
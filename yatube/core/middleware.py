@@ -0,0 +1,123 @@
+"""Замер каждого запроса: SQL, шаблоны, кеш и общее время."""
+import json
+import logging
+import random
+from contextlib import ExitStack
+from time import time
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, routers
+
+logger = logging.getLogger('yatube.performance')
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+def server_timing(request_metrics):
+    """Значение заголовка Server-Timing."""
+    return ', '.join((
+        f'sql;dur={request_metrics.sql_time * 1000:.1f};'
+        f'desc="SQL x{request_metrics.sql_count}"',
+        f'tpl;dur={request_metrics.template_time * 1000:.1f}',
+        f'cache;desc="hit {request_metrics.cache_hits}, '
+        f'miss {request_metrics.cache_misses}"',
+        f'total;dur={request_metrics.elapsed * 1000:.1f}',
+    ))
+
+
+class PerformanceMiddleware:
+    """Собирает метрики запроса по имени вьюхи.
+
+    Стоит первым в MIDDLEWARE, чтобы общее время включало остальные
+    middleware. Медленные запросы пишутся в лог всегда, остальные —
+    с вероятностью PERFORMANCE_LOG_SAMPLE_RATE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = metrics.start_request(request)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.finish_request()
+        name = view_name(request)
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(request_metrics)
+        metrics.aggregator.add(name, request_metrics, response.status_code)
+        self.log(request, response, name, request_metrics)
+        return response
+
+    def log(self, request, response, name, request_metrics):
+        total_ms = request_metrics.elapsed * 1000
+        slow = total_ms >= settings.PERFORMANCE_SLOW_MS
+        if not slow and (random.random()
+                         >= settings.PERFORMANCE_LOG_SAMPLE_RATE):
+            return
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps({
+            'view': name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'sql_count': request_metrics.sql_count,
+            'sql_ms': round(request_metrics.sql_time * 1000, 2),
+            'template_ms': round(request_metrics.template_time * 1000, 2),
+            'cache_hits': request_metrics.cache_hits,
+            'cache_misses': request_metrics.cache_misses,
+            'slow': slow,
+        }, ensure_ascii=False))
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтение лент на реплики с учётом своих записей.
+
+    После любой записи в небезопасном запросе пользователь получает cookie
+    DATABASE_REPLICA_STICKY_COOKIE, и следующие
+    DATABASE_REPLICA_STICKY_SECONDS секунд читает только основную базу,
+    чтобы видеть свой пост или комментарий, пока реплика догоняет.
+    """
+    SAFE_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.database_reads = routers.PRIMARY
+        routers.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.finish_request()
+        if wrote and request.method not in self.SAFE_METHODS:
+            sticky = settings.DATABASE_REPLICA_STICKY_SECONDS
+            response.set_cookie(settings.DATABASE_REPLICA_STICKY_COOKIE,
+                                int(time() + sticky), max_age=sticky,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.DATABASE_REPLICAS
+                and request.method in self.SAFE_METHODS
+                and view_name(request) in settings.DATABASE_REPLICA_VIEWS
+                and not self.sticky(request)):
+            routers.use_replicas()
+            request.database_reads = 'replica'
+
+    @staticmethod
+    def sticky(request):
+        value = request.COOKIES.get(settings.DATABASE_REPLICA_STICKY_COOKIE)
+        try:
+            return value is not None and int(value) > time()
+        except ValueError:
+            return False
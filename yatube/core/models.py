@@ -11,3 +11,43 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class Task(CreatedModel):
+    """Задача фоновой очереди: вызов функции по её пути."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Провалена'),
+    )
+
+    name = models.CharField('Функция', max_length=200)
+    payload = models.TextField('Аргументы в JSON')
+    status = models.CharField('Статус', max_length=10, choices=STATUSES,
+                              default=PENDING)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField('Предел попыток', default=3)
+    run_at = models.DateTimeField('Запустить не раньше')
+    locked_by = models.CharField('Воркер', max_length=100, blank=True)
+    started = models.DateTimeField('Начата', null=True, blank=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+    wait_ms = models.FloatField('Ожидание, мс', null=True, blank=True)
+    run_ms = models.FloatField('Выполнение, мс', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        # Воркер выбирает готовые к запуску задачи по статусу и времени
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='task_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} [{self.status}]'
@@ -0,0 +1,163 @@
+"""Отпечатки SQL-запросов и журнал медленных запросов.
+
+Обёртка курсора приводит SQL к отпечатку (литералы, списки IN и строки
+многострочных INSERT заменены на заглушки), находит в стеке вызывающий
+код приложений из QUERY_STATS_APPS и копит число и время запросов по
+отпечатку, по вьюхе и по месту вызова. Запросы из чужого кода (сессии,
+auth) не считаются. Обёртка ставится на каждое соединение при его
+открытии, поэтому в статистику попадают и фоновые задачи (`task:<имя>`),
+и команды (`background`).
+"""
+import hashlib
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('yatube.sql')
+
+# Инструментирование и тесты не считаются местом вызова
+SKIP_MODULES = ('core.metrics', 'core.queries', 'core.middleware',
+                'core.templates')
+VALUES = r'(?:\?,\s*)*\?'
+ROW = r'\(' + VALUES + r'\)'
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%s|\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE), 'IN (...)'),
+    # Строки bulk_create: VALUES (?, ?), (?, ?) или, на SQLite,
+    # INSERT ... SELECT ?, ? UNION ALL SELECT ?, ?
+    (re.compile(r'\bVALUES\s*' + ROW + r'(?:\s*,\s*' + ROW + ')*',
+                re.IGNORECASE), 'VALUES (...)'),
+    (re.compile(r'\)\s*SELECT ' + VALUES + r'(?:\s+UNION ALL SELECT '
+                + VALUES + ')*', re.IGNORECASE), ') SELECT ...'),
+    (re.compile(r'\s+'), ' '),
+)
+_local = threading.local()
+
+
+def normalize(sql):
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    """(отпечаток, нормализованный SQL)."""
+    normalized = normalize(sql)
+    digest = hashlib.md5(normalized.encode()).hexdigest()[:12]
+    return digest, normalized
+
+
+def app_frames(frame, apps, limit, walk):
+    """Кадры кода приложений от самого глубокого: модуль:строка функция.
+
+    Собирает не больше `limit` кадров и просматривает не больше `walk`
+    кадров стека: запрос чужого кода не обходит весь стек до WSGI.
+    """
+    frames = []
+    while frame is not None and len(frames) < limit and walk > 0:
+        walk -= 1
+        module = frame.f_globals.get('__name__', '')
+        if (module.split('.', 1)[0] in apps
+                and module not in SKIP_MODULES and '.tests' not in module):
+            frames.append(f'{module}:{frame.f_lineno} '
+                          f'{frame.f_code.co_name}')
+        frame = frame.f_back
+    return frames
+
+
+class QueryStats(metrics.SharedStats):
+    """Число и время запросов по отпечатку."""
+
+    def add(self, digest, normalized, view, caller, duration_ms):
+        with self._lock:
+            stats = self._data.get(digest)
+            if stats is None:
+                stats = self._data[digest] = {
+                    'sql': normalized, 'count': 0, 'total_ms': 0.0,
+                    'max_ms': 0.0, 'views': {}, 'callers': {},
+                }
+            stats['count'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['views'][view] = stats['views'].get(view, 0) + 1
+            stats['callers'][caller] = stats['callers'].get(caller, 0) + 1
+        self._flush_if_due()
+
+
+query_stats = QueryStats('queries')
+
+
+@contextmanager
+def label(name):
+    """Метка запросов вне HTTP-запроса, например `task:<имя задачи>`."""
+    previous = getattr(_local, 'label', None)
+    _local.label = name
+    try:
+        yield
+    finally:
+        _local.label = previous
+
+
+def install(sender=None, connection=None, **kwargs):
+    """Приёмник connection_created: ставит обёртку на соединение."""
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """Обёртка курсора для connection.execute_wrapper.
+
+    Для статистики нужен только ближайший кадр приложения; полный стек
+    собирается лишь для медленного запроса, который пишется в журнал.
+    """
+    caller = sys._getframe(1)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        slow = duration_ms >= settings.QUERY_SLOW_MS
+        frames = app_frames(caller, settings.QUERY_STATS_APPS,
+                            settings.QUERY_STACK_DEPTH if slow else 1,
+                            settings.QUERY_STACK_WALK)
+        if frames:
+            _record(sql, params, many, frames, duration_ms, slow)
+
+
+def _record(sql, params, many, frames, duration_ms, slow):
+    digest, normalized = fingerprint(sql)
+    view = (metrics.current_view() or getattr(_local, 'label', None)
+            or 'background')
+    query_stats.add(digest, normalized, view, frames[0], duration_ms)
+    if slow:
+        logger.warning(json.dumps({
+            'fingerprint': digest,
+            'view': view,
+            'duration_ms': round(duration_ms, 2),
+            'sql': sql[:2000],
+            'params': None if many else repr(params)[:500],
+            'stack': frames,
+        }, ensure_ascii=False))
+
+
+def top_queries(limit=50, view=None):
+    """Самые дорогие по суммарному времени отпечатки всех воркеров."""
+    stats, workers = query_stats.collect()
+    rows = []
+    for digest, row in stats.items():
+        if view is not None and view not in row['views']:
+            continue
+        row['fingerprint'] = digest
+        row['mean_ms'] = round(row['total_ms'] / row['count'], 3)
+        rows.append(row)
+    rows.sort(key=lambda row: row['total_ms'], reverse=True)
+    return {'workers': workers, 'queries': rows[:limit]}
@@ -0,0 +1,73 @@
+"""Чтение лент с реплик и запись в основную базу.
+
+Реплики включаются только для вьюх из DATABASE_REPLICA_VIEWS и только
+на время GET/HEAD-запроса: это решает `ReplicaRoutingMiddleware`.
+Реплика выбирается одна на запрос, чтобы все его чтения видели один
+снимок данных. Всё остальное, включая фоновые задачи и команды,
+работает с `default`.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+_state = threading.local()
+
+
+def replicas_enabled():
+    return getattr(_state, 'replicas', False)
+
+
+def start_request():
+    _state.replicas = _state.wrote = False
+
+
+def use_replicas():
+    """Включает чтение с реплики, выбранной случайно на весь запрос."""
+    replicas = settings.DATABASE_REPLICAS
+    _state.replica = random.choice(replicas) if replicas else PRIMARY
+    _state.replicas = True
+
+
+def finish_request():
+    """Сбрасывает состояние и сообщает, была ли запись в базу."""
+    wrote = getattr(_state, 'wrote', False)
+    _state.replicas = _state.wrote = False
+    return wrote
+
+
+@contextmanager
+def replica_reads():
+    """Чтение с реплик внутри блока, например в команде."""
+    previous = replicas_enabled(), getattr(_state, 'replica', None)
+    use_replicas()
+    try:
+        yield
+    finally:
+        _state.replicas, _state.replica = previous
+
+
+class ReplicaRouter:
+    """Читает с реплики запроса, когда это разрешено, пишет в default."""
+
+    def db_for_read(self, model, **hints):
+        if replicas_enabled() and settings.DATABASE_REPLICAS:
+            return _state.replica
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        # Запрос, который пишет, дальше читает свои же данные
+        _state.replicas = False
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными основной базы
+        return db == PRIMARY
@@ -0,0 +1,174 @@
+"""Фоновая очередь задач в базе данных.
+
+Функция, помеченная `@task`, ставится в очередь вызовом `.delay()`:
+задача пишется строкой `Task` в той же транзакции, что и данные, и
+воркер (`manage.py run_tasks`) увидит её только после коммита. При
+TASKS_EAGER задачи выполняются сразу в вызывающем коде — так работают
+тесты и разработка без запущенного воркера.
+
+Упавшая задача повторяется с экспоненциальной задержкой, пока не
+исчерпает max_attempts. Задачу, чей воркер пропал, возвращает в очередь
+`requeue_stale` по истечении TASK_VISIBILITY_TIMEOUT; это тоже попытка.
+Итог выполнения записывается, только если задача всё ещё за этим
+воркером: иначе её уже вернули в очередь и взял другой.
+"""
+import json
+import logging
+import traceback
+from datetime import timedelta
+from functools import update_wrapper
+
+from django.conf import settings
+from django.db.models import Avg, Count, F, Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import queries
+from .models import Task
+
+logger = logging.getLogger('yatube.tasks')
+
+
+class TaskFunction:
+    """Обёртка функции: обычный вызов и постановка в очередь."""
+
+    def __init__(self, func, max_attempts=None):
+        update_wrapper(self, func)
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return enqueue(self.name, args, kwargs, self.max_attempts)
+
+
+def task(func=None, *, max_attempts=None):
+    """Декоратор задачи; аргументы должны сериализоваться в JSON."""
+    if func is None:
+        return lambda func: TaskFunction(func, max_attempts)
+    return TaskFunction(func, max_attempts)
+
+
+def enqueue(name, args=(), kwargs=None, max_attempts=None):
+    """Ставит задачу в очередь или сразу выполняет её при TASKS_EAGER."""
+    kwargs = kwargs or {}
+    if settings.TASKS_EAGER:
+        import_string(name)(*args, **kwargs)
+        return None
+    return Task.objects.create(
+        name=name,
+        payload=json.dumps({'args': list(args), 'kwargs': kwargs}),
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+        run_at=timezone.now(),
+    )
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач; гонку воркеров решает UPDATE."""
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status=Task.PENDING, run_at__lte=now
+    ).order_by('run_at', 'pk').values_list('pk', flat=True)[:limit]
+    claimed = []
+    for pk in list(candidates):
+        if Task.objects.filter(pk=pk, status=Task.PENDING).update(
+                status=Task.RUNNING, locked_by=worker, started=now):
+            claimed.append(pk)
+    return list(Task.objects.filter(pk__in=claimed).order_by('run_at',
+                                                             'pk'))
+
+
+def execute(task_row):
+    """Выполняет захваченную задачу и записывает итог и задержки."""
+    started = timezone.now()
+    wait_ms = (started - task_row.run_at).total_seconds() * 1000
+    attempts = task_row.attempts + 1
+    try:
+        payload = json.loads(task_row.payload)
+        with queries.label(f'task:{task_row.name}'):
+            import_string(task_row.name)(*payload['args'],
+                                         **payload['kwargs'])
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Задача %s (%s) упала, попытка %s из %s',
+                       task_row.pk, task_row.name, attempts,
+                       task_row.max_attempts)
+        update = {'attempts': attempts, 'last_error': error,
+                  'locked_by': ''}
+        if attempts >= task_row.max_attempts:
+            update.update(status=Task.FAILED, finished=timezone.now())
+        else:
+            delay = settings.TASK_RETRY_DELAY * 2 ** (attempts - 1)
+            update.update(status=Task.PENDING,
+                          run_at=timezone.now() + timedelta(seconds=delay))
+        _finish(task_row, **update)
+        return False
+    finished = timezone.now()
+    _finish(task_row, status=Task.DONE, attempts=attempts,
+            finished=finished, locked_by='', wait_ms=wait_ms,
+            run_ms=(finished - started).total_seconds() * 1000)
+    return True
+
+
+def _finish(task_row, **update):
+    """Записывает итог, если задачу не забрал у воркера requeue_stale."""
+    if not Task.objects.filter(
+            pk=task_row.pk, status=Task.RUNNING,
+            locked_by=task_row.locked_by).update(**update):
+        logger.warning('Задача %s (%s) вернулась в очередь, пока '
+                       'выполнялась на %s', task_row.pk, task_row.name,
+                       task_row.locked_by)
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи воркеров, не завершивших их вовремя.
+
+    Пропавший воркер засчитывает попытку: задача, которая каждый раз
+    роняет процесс, не должна крутиться в очереди вечно.
+    """
+    now = timezone.now()
+    stale = Task.objects.filter(
+        status=Task.RUNNING,
+        started__lt=now - timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT))
+    stale.filter(attempts__gte=F('max_attempts') - 1).update(
+        status=Task.FAILED, attempts=F('attempts') + 1, locked_by='',
+        finished=now, last_error='Воркер не завершил задачу за '
+                                 'TASK_VISIBILITY_TIMEOUT')
+    return stale.update(status=Task.PENDING, attempts=F('attempts') + 1,
+                        locked_by='')
+
+
+def prune_done():
+    """Удаляет выполненные задачи старше TASK_KEEP_DONE секунд."""
+    deadline = timezone.now() - timedelta(seconds=settings.TASK_KEEP_DONE)
+    deleted, _ = Task.objects.filter(status=Task.DONE,
+                                     finished__lt=deadline).delete()
+    return deleted
+
+
+def queue_stats():
+    """Глубина очереди по статусам и задержки выполненных задач."""
+    depth = {}
+    for name, status, count in Task.objects.order_by().values_list(
+            'name', 'status').annotate(count=Count('pk')):
+        depth.setdefault(name, {})[status] = count
+    latency = {
+        name: {
+            'done': done,
+            'mean_wait_ms': round(mean_wait or 0, 2),
+            'max_wait_ms': round(max_wait or 0, 2),
+            'mean_run_ms': round(mean_run or 0, 2),
+            'max_run_ms': round(max_run or 0, 2),
+        }
+        for name, done, mean_wait, max_wait, mean_run, max_run in (
+            Task.objects.filter(status=Task.DONE).order_by()
+            .values_list('name').annotate(
+                Count('pk'), Avg('wait_ms'), Max('wait_ms'),
+                Avg('run_ms'), Max('run_ms')))
+    }
+    ready = Task.objects.filter(status=Task.PENDING,
+                                run_at__lte=timezone.now()).count()
+    return {'ready': ready, 'depth': depth, 'latency': latency}
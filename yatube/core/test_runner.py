@@ -0,0 +1,58 @@
+import copy
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django.utils.log import configure_logging
+
+# Зеркало тестовой базы default: отдельное соединение для проверки
+# чтения с реплики
+REPLICA_ALIAS = 'replica_test'
+
+
+class isolated_settings(override_settings):
+    """Настройки тестов: кеш в памяти процесса, задачи без воркера.
+
+    Общий файл кеша разработчика не очищается тестами и не создаётся,
+    реплики из YATUBE_DB_REPLICAS не используются, выборка запросов
+    yatube.performance не печатается. Подключается и раннером
+    `manage.py test`, и фикстурой pytest в tests/conftest.py.
+    """
+
+    def __init__(self):
+        # Уровень логгера задаётся через LOGGING: django.setup() в
+        # WSGI-прогоне бенчмарка заново применяет конфигурацию логов
+        config = copy.deepcopy(settings.LOGGING)
+        config['loggers']['yatube.performance']['level'] = 'CRITICAL'
+        super().__init__(CACHES=settings.TEST_CACHES, TASKS_EAGER=True,
+                         DATABASE_REPLICAS=[], LOGGING=config)
+
+    def enable(self):
+        super().enable()
+        configure_logging(settings.LOGGING_CONFIG, settings.LOGGING)
+
+    def disable(self):
+        super().disable()
+        configure_logging(settings.LOGGING_CONFIG, settings.LOGGING)
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с настройками `isolated_settings`."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._settings = isolated_settings()
+        self._settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        default = settings.DATABASES['default']
+        settings.DATABASES[REPLICA_ALIAS] = {
+            'ENGINE': default['ENGINE'],
+            'NAME': default['NAME'],
+            'TEST': {'MIRROR': 'default'},
+        }
+        return super().setup_databases(**kwargs)
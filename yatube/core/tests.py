@@ -1,6 +1,42 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         modify_settings, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import metrics, queries, routers, tasks
+from core.cache import SQLiteCache, get_or_compute
+from core.models import Task
+from core.test_runner import REPLICA_ALIAS
+from posts.counters import post_count
+from posts.models import Post
+
+CALLS = []
+
+
+@tasks.task
+def remember(value):
+    CALLS.append(value)
+
+
+@tasks.task(max_attempts=2)
+def explode():
+    raise RuntimeError('Бум')
 
 
 class ViewTestClass(TestCase):
@@ -9,3 +45,375 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    """Проверка общего кеша на SQLite."""
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.cache = SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'),
+            {'KEY_PREFIX': 'test', 'OPTIONS': {'COMPRESS_MIN_LENGTH': 100}},
+        )
+
+    def test_set_get_and_compression(self):
+        page = 'страница ' * 1000
+        self.cache.set('page', page)
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.cache.get('page'), page)
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+        self.cache.delete('page')
+        self.assertIsNone(self.cache.get('page'))
+
+    def test_add_incr_and_expiry(self):
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter'), 2)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('gone', 1, timeout=-1)
+        self.assertFalse(self.cache.has_key('gone'))
+        self.assertTrue(self.cache.add('gone', 2))
+
+    def test_get_or_compute_runs_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 'value'
+
+        for _ in range(3):
+            value = get_or_compute('key', compute, 60, cache=self.cache)
+        self.assertEqual(value, 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_get_or_compute_serves_stale_while_locked(self):
+        self.cache.set('key', ('old', 0), 60)
+        self.cache.add('key:lock', 1)
+        value = get_or_compute('key', lambda: 'new', 60, cache=self.cache)
+        self.assertEqual(value, 'old')
+        self.cache.delete('key:lock')
+        value = get_or_compute('key', lambda: 'new', 60, cache=self.cache)
+        self.assertEqual(value, 'new')
+
+
+class PerformanceMiddlewareTest(TestCase):
+    """Проверка метрик запросов."""
+    def setUp(self):
+        cache.clear()
+        metrics.aggregator.reset()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for metric in ('sql;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            self.assertIn(metric, timing)
+
+    def test_cache_hits_counted_for_any_backend(self):
+        """Попадания считаются и для кеша в памяти, а не только SQLite."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertRegex(response['Server-Timing'], r'cache;desc="hit [1-9]')
+        stats = metrics.aggregator.snapshot()['posts:index']
+        self.assertGreater(stats['cache_hits'], 0)
+        self.assertGreater(stats['cache_misses'], 0)
+
+    def test_no_queries_of_its_own(self):
+        """Замеры не добавляют запросов к бюджету страницы."""
+        url = reverse('posts:index')
+
+        def count():
+            cache.clear()
+            with CaptureQueriesContext(connections['default']) as captured:
+                self.client.get(url)
+            return len(captured)
+
+        # Первый запрос заводит счётчики, сравниваются следующие
+        count()
+        measured = count()
+        with modify_settings(MIDDLEWARE={
+                'remove': 'core.middleware.PerformanceMiddleware'}):
+            self.assertEqual(count(), measured)
+
+    def test_metrics_grouped_by_view_name(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get('/nonexist-page/')
+        stats = metrics.aggregator.snapshot()
+        index = stats['posts:index']
+        self.assertEqual(index['requests'], 2)
+        self.assertGreater(index['sql_count'], 0)
+        self.assertGreater(index['template_ms'], 0)
+        self.assertEqual(sum(index['latency_histogram']), 2)
+        self.assertEqual(stats['unresolved']['requests'], 1)
+
+    def test_stats_only_for_staff(self):
+        url = reverse('core:performance')
+        user = get_user_model().objects.create_user('reader')
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        user.is_staff = True
+        user.save()
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        data = response.json()
+        self.assertIn('posts:index', data['views'])
+        self.assertEqual(len(data['latency_buckets_ms']) + 1, len(
+            data['views']['posts:index']['latency_histogram']))
+
+
+class QueryStatsTest(TestCase):
+    """Проверка отпечатков SQL и журнала медленных запросов."""
+    def setUp(self):
+        queries.query_stats.reset()
+        self.author = get_user_model().objects.create_user('author')
+
+    def test_fingerprint_ignores_literals(self):
+        first, normalized = queries.fingerprint(
+            "SELECT * FROM t WHERE id IN (%s, %s) AND name = 'x' LIMIT 10")
+        second, _ = queries.fingerprint(
+            "SELECT *  FROM t WHERE id IN (%s) AND name = 'y' LIMIT 20")
+        self.assertEqual(first, second)
+        self.assertEqual(
+            normalized, 'SELECT * FROM t WHERE id IN (...) AND name = ? '
+                        'LIMIT ?')
+
+    def test_bulk_rows_collapsed(self):
+        one, _ = queries.fingerprint(
+            'INSERT INTO t (a, b) VALUES (%s, %s)')
+        many, normalized = queries.fingerprint(
+            'INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)')
+        self.assertEqual(one, many)
+        self.assertEqual(normalized, 'INSERT INTO t (a, b) VALUES (...)')
+        one, _ = queries.fingerprint(
+            'INSERT OR IGNORE INTO t (a, b) SELECT %s, %s')
+        many, normalized = queries.fingerprint(
+            'INSERT OR IGNORE INTO t (a, b) SELECT %s, %s '
+            'UNION ALL SELECT %s, %s UNION ALL SELECT %s, %s')
+        self.assertEqual(one, many)
+        self.assertEqual(normalized,
+                         'INSERT OR IGNORE INTO t (a, b) SELECT ...')
+
+    @override_settings(TASKS_EAGER=False)
+    def test_background_queries_labelled(self):
+        Post.objects.create(author=self.author, text='Пост')
+        post_count()
+        for task in tasks.claim('test', 10):
+            tasks.execute(task)
+        views = set()
+        for row in queries.query_stats.snapshot().values():
+            views.update(row['views'])
+        self.assertIn('background', views)
+        self.assertIn('task:posts.tasks.index_post', views)
+
+    def test_queries_grouped_by_view_and_caller(self):
+        self.client.get(reverse('posts:profile', args=[self.author]))
+        stats = queries.query_stats.snapshot()
+        self.assertTrue(stats)
+        views = set()
+        for row in stats.values():
+            views.update(row['views'])
+            for caller in row['callers']:
+                self.assertNotIn('core.queries', caller)
+        self.assertIn('posts:profile', views)
+
+    @override_settings(QUERY_SLOW_MS=0)
+    def test_slow_query_logged_with_stack(self):
+        with self.assertLogs('yatube.sql', 'WARNING') as logs:
+            self.client.get(reverse('posts:profile', args=[self.author]))
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual(records[0]['view'], 'posts:profile')
+        # Первый запрос делает posts.cache.author_feeds для ETag
+        self.assertTrue(records[0]['stack'][0].startswith('posts.cache:'))
+        self.assertTrue(any(record['stack'][0].startswith('posts.views:')
+                            for record in records))
+
+    def test_stack_walk_bounded(self):
+        """Поиск кадров приложений не обходит стек дальше walk кадров."""
+        def nested(depth):
+            if depth:
+                return nested(depth - 1)
+            frame = sys._getframe()
+            return (queries.app_frames(frame, ('unittest',), 1, 50),
+                    queries.app_frames(frame, ('unittest',), 1, 1000))
+
+        bounded, full = nested(100)
+        self.assertEqual(bounded, [])
+        self.assertEqual(len(full), 1)
+
+    def test_full_stack_only_for_slow_queries(self):
+        """Быстрым запросам хватает одного кадра места вызова."""
+        url = reverse('posts:profile', args=[self.author])
+        with mock.patch.object(queries, 'app_frames',
+                               wraps=queries.app_frames) as walk:
+            self.client.get(url)
+            self.assertEqual({call[0][2] for call in walk.call_args_list},
+                             {1})
+            walk.reset_mock()
+            with override_settings(QUERY_SLOW_MS=0), \
+                    self.assertLogs('yatube.sql', 'WARNING'):
+                self.client.get(url)
+            self.assertEqual({call[0][2] for call in walk.call_args_list},
+                             {settings.QUERY_STACK_DEPTH})
+
+    def test_top_queries_endpoint(self):
+        staff = get_user_model().objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        self.client.get(reverse('posts:profile', args=[self.author]))
+        response = self.client.get(reverse('core:queries'),
+                                   {'view': 'posts:profile'})
+        rows = response.json()['queries']
+        self.assertTrue(rows)
+        totals = [row['total_ms'] for row in rows]
+        self.assertEqual(totals, sorted(totals, reverse=True))
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaRoutingTest(TestCase):
+    """Проверка чтения лент с реплик."""
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('reader')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.client.force_login(self.user)
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_router(self):
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), routers.PRIMARY)
+        with routers.replica_reads():
+            self.assertEqual(router.db_for_read(Post), 'replica1')
+            router.db_for_write(Post)
+            self.assertFalse(routers.replicas_enabled())
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_one_replica_per_request(self):
+        router = routers.ReplicaRouter()
+        for _ in range(5):
+            with routers.replica_reads():
+                self.assertEqual(
+                    len({router.db_for_read(Post) for _ in range(20)}), 1)
+
+    def test_feed_reads_from_replica(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.wsgi_request.database_reads, 'replica')
+        response = self.client.get(reverse('posts:post_create'))
+        self.assertEqual(response.wsgi_request.database_reads,
+                         routers.PRIMARY)
+
+    def test_reads_primary_after_own_write(self):
+        cookie = 'db_primary_until'
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'Комментарий'})
+        self.assertIn(cookie, response.cookies)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+        self.assertEqual(response.wsgi_request.database_reads,
+                         routers.PRIMARY)
+        self.client.cookies.pop(cookie)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+        self.assertEqual(response.wsgi_request.database_reads, 'replica')
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA_ALIAS])
+class ReplicaConnectionTest(TransactionTestCase):
+    """Чтение ленты через отдельное соединение реплики."""
+    databases = {'default', REPLICA_ALIAS}
+
+    def test_feed_queries_go_to_replica(self):
+        author = get_user_model().objects.create_user('author')
+        Post.objects.create(author=author, text='Пост с реплики')
+        # Счётчик создаётся записью, после которой запрос читает default
+        post_count()
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост с реплики')
+        self.assertTrue([query for query in replica.captured_queries
+                         if 'posts_post' in query['sql']])
+        self.assertFalse([query for query in primary.captured_queries
+                          if 'posts_post' in query['sql']])
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTest(TestCase):
+    """Проверка фоновой очереди задач."""
+    def setUp(self):
+        CALLS.clear()
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode(self):
+        self.assertIsNone(remember.delay('сразу'))
+        self.assertEqual(CALLS, ['сразу'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_worker_runs_task(self):
+        remember.delay('в очереди')
+        self.assertEqual(CALLS, [])
+        call_command('run_tasks', once=True, stdout=StringIO())
+        self.assertEqual(CALLS, ['в очереди'])
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.DONE)
+        self.assertIsNotNone(task.run_ms)
+        stats = tasks.queue_stats()
+        self.assertEqual(stats['depth']['core.tests.remember'],
+                         {Task.DONE: 1})
+        self.assertEqual(stats['latency']['core.tests.remember']['done'], 1)
+
+    def test_retry_then_fail(self):
+        explode.delay()
+        with self.assertLogs('yatube.tasks', 'WARNING'):
+            self.assertFalse(tasks.execute(tasks.claim('test', 10)[0]))
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertEqual(tasks.claim('test', 10), [])
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('yatube.tasks', 'WARNING'):
+            tasks.execute(tasks.claim('test', 10)[0])
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIn('Бум', task.last_error)
+
+    def test_stale_task_requeued(self):
+        remember.delay('потеряна')
+        self.assertEqual(len(tasks.claim('test', 10)), 1)
+        self.assertEqual(tasks.claim('other', 10), [])
+        Task.objects.update(started=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tasks.requeue_stale(), 1)
+        self.assertEqual(Task.objects.get().attempts, 1)
+        self.assertEqual(len(tasks.claim('other', 10)), 1)
+
+    def test_stale_task_counts_attempts(self):
+        explode.delay()
+        for status in (Task.PENDING, Task.FAILED):
+            tasks.claim('test', 10)
+            Task.objects.update(started=timezone.now() - timedelta(hours=1))
+            tasks.requeue_stale()
+            self.assertEqual(Task.objects.get().status, status)
+        self.assertEqual(Task.objects.get().attempts, 2)
+
+    def test_requeued_task_result_ignored(self):
+        remember.delay('дважды')
+        lost = tasks.claim('test', 10)[0]
+        Task.objects.update(started=timezone.now() - timedelta(hours=1))
+        tasks.requeue_stale()
+        tasks.claim('other', 10)
+        with self.assertLogs('yatube.tasks', 'WARNING'):
+            tasks.execute(lost)
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.locked_by),
+                         (Task.RUNNING, 'other'))
+
+    def test_post_side_effects_queued(self):
+        author = get_user_model().objects.create_user('author')
+        Post.objects.create(author=author, text='Пост')
+        self.assertEqual(
+            set(Task.objects.values_list('name', flat=True)),
+            {'posts.tasks.fan_out_post', 'posts.tasks.index_post'})
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузки сразу во временный файл, не держа их в памяти.
+
+    Запросы длиннее FILE_UPLOAD_MAX_REQUEST_SIZE отклоняются до чтения
+    тела с ответом 400.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length > settings.FILE_UPLOAD_MAX_REQUEST_SIZE:
+            raise RequestDataTooBig(
+                'Request body exceeded FILE_UPLOAD_MAX_REQUEST_SIZE.')
+        return super().handle_raw_input(
+            input_data, META, content_length, boundary, encoding)
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+urlpatterns = [
+    path('performance/', views.performance_stats, name='performance'),
+    path('performance/queries/', views.query_stats, name='queries'),
+    path('performance/tasks/', views.task_stats, name='tasks'),
+]
@@ -1,6 +1,12 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 from http import HTTPStatus
 
+from .metrics import collected_stats
+from .queries import top_queries
+from .tasks import queue_stats
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -16,3 +22,28 @@ def permission_denied(request, exception):
 
 def server_lost(request):
     return render(request, "misc/500.html", status=500)
+
+
+@staff_member_required
+def performance_stats(request):
+    """Гистограммы и суммы метрик по вьюхам для персонала."""
+    return JsonResponse(collected_stats(),
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@staff_member_required
+def query_stats(request):
+    """Самые дорогие SQL-запросы по отпечаткам, можно ?view=posts:index."""
+    try:
+        limit = int(request.GET.get('limit', 50))
+    except ValueError:
+        limit = 50
+    return JsonResponse(top_queries(limit, request.GET.get('view')),
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@staff_member_required
+def task_stats(request):
+    """Глубина фоновой очереди и задержки задач."""
+    return JsonResponse(queue_stats(),
+                        json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,207 @@
+"""JSON-API лент только для чтения.
+
+Ленты отдаются курсорными страницами (`?cursor=`), набор полей поста
+задаётся параметром `?fields=id,text,author`. Сильный ETag считается по
+id и времени изменения постов страницы и по `feeds_modified` лент:
+правка поста и новый комментарий меняют `updated`, новый или удалённый
+пост сдвигает состав страницы, а переименование автора, правка группы
+и подписки отмечают ленту изменённой. Last-Modified у лент нет: по
+времени нельзя заметить удаление поста. Ответ 304 стоит одного лёгкого
+запроса без сборки JSON и счётчиков.
+"""
+from datetime import datetime, timezone
+from hashlib import md5
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .cache import feeds_modified
+from .counters import post_count, user_profile
+from .models import Group, Post, User
+from .timeline import timeline_posts
+from .utils import CountedPaginator, KeysetPaginator
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'updated': lambda post: post.updated.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'comments_count': lambda post: post.comments_count,
+    'url': lambda post: reverse('posts:post_detail', args=[post.pk]),
+}
+# Поля, для которых нужен JOIN со связанной таблицей
+RELATED_FIELDS = ('author', 'group')
+
+
+def api_error(status, message):
+    return JsonResponse({'error': message}, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def parse_fields(request):
+    """Запрошенные поля поста; ValueError для неизвестных."""
+    value = request.GET.get('fields')
+    if not value:
+        return tuple(POST_FIELDS)
+    fields = tuple(dict.fromkeys(
+        name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f'Неизвестные поля: {", ".join(unknown)}. '
+                         f'Доступны: {", ".join(POST_FIELDS)}')
+    return fields
+
+
+def serialize_post(post, fields):
+    return {name: POST_FIELDS[name](post) for name in fields}
+
+
+def make_etag(request, *parts):
+    source = repr((request.get_full_path(), *parts))
+    return f'"{md5(source.encode()).hexdigest()}"'
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def conditional_json(request, etag, build, last_modified=None,
+                     private=False):
+    """304, если клиент прислал актуальный ETag, иначе JSON из build()."""
+    # Last-Modified передаётся с точностью до секунды
+    timestamp = last_modified and int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=timestamp)
+    if response is None:
+        response = JsonResponse(build(),
+                                json_dumps_params={'ensure_ascii': False})
+    response['ETag'] = etag
+    if timestamp:
+        response['Last-Modified'] = http_date(timestamp)
+    if private:
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def feed_response(request, posts, feeds, meta=None, private=False):
+    """Курсорная страница ленты posts с условным GET.
+
+    `feeds` — имена лент для `feeds_modified`, `meta()` возвращает
+    словарь шапки и вызывается только при сборке ответа.
+    """
+    try:
+        fields = parse_fields(request)
+    except ValueError as error:
+        return api_error(400, str(error))
+    page = KeysetPaginator(
+        posts.only('pk', 'pub_date', 'updated'), settings.POST_PER_PAGE
+    ).get_page(request.GET.get('cursor'))
+    versions = [(post.pk, post.updated) for post in page]
+    user = request.user.pk if private else None
+    etag = make_etag(request, versions, feeds_modified(*feeds), user)
+
+    def build():
+        related = [name for name in RELATED_FIELDS if name in fields]
+        found = posts.select_related(*related).in_bulk(
+            [pk for pk, _ in versions])
+        return {
+            **(meta() if meta else {}),
+            'results': [serialize_post(found[pk], fields)
+                        for pk, _ in versions if pk in found],
+            'next': page_url(request, page.next_cursor),
+            'previous': page_url(request, page.previous_cursor),
+        }
+
+    return conditional_json(request, etag, build, private=private)
+
+
+def index(request):
+    return feed_response(request, Post.objects.all(), ['index'])
+
+
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+
+    def meta():
+        return {'group': {
+            'slug': group.slug,
+            'title': group.title,
+            'description': group.description,
+            'posts_count': post_count(group=group),
+        }}
+
+    # Не group.posts: менеджер связи проставляет постам группу и
+    # обращается к отложенному group_id, по запросу на пост
+    return feed_response(request, Post.objects.filter(group=group),
+                         [f'group:{group.pk}'], meta)
+
+
+def profile(request, username):
+    author = get_object_or_404(User.objects.select_related('profile'),
+                               username=username)
+
+    def meta():
+        counters = user_profile(author)
+        return {'author': {
+            'username': author.username,
+            'full_name': author.get_full_name(),
+            'posts_count': post_count(author=author),
+            'followers_count': counters.followers_count,
+            'following_count': counters.following_count,
+        }}
+
+    return feed_response(request, Post.objects.filter(author=author),
+                         [f'author:{author.pk}'], meta)
+
+
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return api_error(401, 'Нужна авторизация')
+    # Подписка и отписка отмечают ленту профиля подписчика
+    return feed_response(request, timeline_posts(request.user),
+                         [f'author:{request.user.pk}'], private=True)
+
+
+def post_detail(request, post_id):
+    """Пост и страница его комментариев (`?comments=N`)."""
+    try:
+        fields = parse_fields(request)
+    except ValueError as error:
+        return api_error(400, str(error))
+    post = get_object_or_404(
+        Post.objects.select_related(*RELATED_FIELDS), id=post_id)
+    # Переименования пользователей и правка групп отмечают `all`
+    modified = max(post.updated,
+                   datetime.fromtimestamp(feeds_modified(), timezone.utc))
+    etag = make_etag(request, post.pk, post.updated, modified)
+
+    def build():
+        comments = CountedPaginator(
+            post.comments.select_related('author'),
+            settings.COMMENTS_PER_PAGE,
+            count=post.comments_count
+        ).get_page(request.GET.get('comments'))
+        return {
+            **serialize_post(post, fields),
+            'comments': [{
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            } for comment in comments],
+            'comments_page': comments.number,
+            'comments_pages': comments.paginator.num_pages,
+        }
+
+    return conditional_json(request, etag, build, modified)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name: str = 'Написание постов'
+
+    def ready(self):
+        from django.conf import settings
+        from PIL import Image
+
+        from . import signals  # noqa: F401
+
+        # Image.open отклоняет «бомбы» ещё на чтении заголовка
+        Image.MAX_IMAGE_PIXELS = settings.POST_IMAGE_MAX_PIXELS
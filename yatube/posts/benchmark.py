@@ -0,0 +1,245 @@
+"""Нагрузочный прогон страниц yatube.
+
+Набор данных детерминированно по зерну генерирует seed_database, затем
+каждый сценарий прогоняется через тестовый клиент Django (с подсчётом
+SQL-запросов) и через локальный WSGI-сервер (с параллельными
+клиентами). Результат — словарь, который команда benchmark сохраняет
+в JSON для сравнения прогонов.
+"""
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                          WSGIRequestHandler)
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Group, User
+from .seeding import seed_database
+
+SCENARIOS = ('index', 'group_posts', 'profile', 'post_detail',
+             'follow_index', 'post_create', 'add_comment')
+PERCENTILES = (50, 90, 95, 99)
+
+
+def seed(users=20, groups=5, posts=200, comments=500, follows=5,
+         images=0.3, seed=0):
+    """Заполняет базу через seed_database и собирает данные сценариев.
+
+    Читатель ленты подписок — первый созданный пользователь.
+    """
+    result = seed_database(users=users, groups=groups, posts=posts,
+                           comments=comments, follows=follows,
+                           images=images, seed=seed, prefix='bench')
+    return {
+        'usernames': list(User.objects.filter(
+            pk__in=result['user_ids']).values_list('username', flat=True)),
+        'group_slugs': list(Group.objects.filter(
+            pk__in=result['group_ids']).values_list('slug', flat=True)),
+        'post_ids': result['post_ids'],
+        'reader_id': result['user_ids'][0],
+    }
+
+
+def build_requests(name, dataset, rng):
+    """(метод, путь, данные, нужен ли вход) для сценария."""
+    if name == 'index':
+        return 'GET', reverse('posts:index'), None, False
+    if name == 'group_posts':
+        slug = rng.choice(dataset['group_slugs'])
+        return 'GET', reverse('posts:group_list', args=[slug]), None, False
+    if name == 'profile':
+        username = rng.choice(dataset['usernames'])
+        return 'GET', reverse('posts:profile', args=[username]), None, False
+    if name == 'post_detail':
+        post_id = rng.choice(dataset['post_ids'])
+        return 'GET', reverse('posts:post_detail', args=[post_id]), None, False
+    if name == 'follow_index':
+        return 'GET', reverse('posts:follow_index'), None, True
+    if name == 'post_create':
+        data = {'text': f'Новый пост {rng.random()}'}
+        return 'POST', reverse('posts:post_create'), data, True
+    if name == 'add_comment':
+        post_id = rng.choice(dataset['post_ids'])
+        data = {'text': f'Новый комментарий {rng.random()}'}
+        return 'POST', reverse('posts:add_comment', args=[post_id]), data, True
+    raise ValueError(f'Неизвестный сценарий: {name}')
+
+
+def summarize(latencies, elapsed, errors, queries=None):
+    """Перцентили задержки в мс, пропускная способность и запросы к БД."""
+    ordered = sorted(latencies)
+    summary = {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput_rps': round(len(ordered) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {},
+    }
+    if ordered:
+        summary['latency_ms'] = {
+            'min': round(ordered[0] * 1000, 3),
+            'mean': round(statistics.mean(ordered) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3),
+            **{f'p{percent}': round(
+                ordered[min(len(ordered) - 1,
+                            int(len(ordered) * percent / 100))] * 1000, 3)
+               for percent in PERCENTILES},
+        }
+    if queries:
+        summary['queries'] = {'mean': round(statistics.mean(queries), 2),
+                              'max': max(queries)}
+    return summary
+
+
+class ClientTarget:
+    """Запросы через тестовый клиент в текущем потоке."""
+    name = 'client'
+
+    def __init__(self, reader):
+        self.guest = Client()
+        self.user = Client()
+        self.user.force_login(reader)
+
+    def request(self, method, path, data, auth):
+        client = self.user if auth else self.guest
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'POST':
+                response = client.post(path, data)
+            else:
+                response = client.get(path)
+        return response.status_code, len(queries)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class WSGITarget:
+    """Запросы по HTTP к WSGI-серверу, запущенному в фоновом потоке."""
+    name = 'wsgi'
+
+    def __init__(self, reader):
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+        self.server.set_app(get_wsgi_application())
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        client = Client()
+        client.force_login(reader)
+        session = client.cookies['sessionid'].value
+        self.cookie = f'sessionid={session}'
+        # Токен CSRF выдаёт сам сервер на странице с формой
+        status, headers = self._send('GET', reverse('posts:post_create'),
+                                     None, self.cookie)
+        token = SimpleCookie(headers.get('Set-Cookie', ''))['csrftoken']
+        self.csrf_token = token.value
+        self.cookie += f'; csrftoken={self.csrf_token}'
+
+    def _send(self, method, path, body, cookie):
+        host, port = self.server.server_address
+        http = HTTPConnection(host, port, timeout=30)
+        headers = {'Cookie': cookie} if cookie else {}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.csrf_token
+        try:
+            http.request(method, path, body=body, headers=headers)
+            response = http.getresponse()
+            response.read()
+            return response.status, response.headers
+        finally:
+            http.close()
+
+    def request(self, method, path, data, auth):
+        body = urlencode(data) if data is not None else None
+        status, _ = self._send(method, path, body,
+                               self.cookie if auth else None)
+        return status, None
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_scenario(target, name, dataset, count, concurrency=1, warmup=5,
+                 seed=0):
+    """Прогоняет сценарий count раз и возвращает сводку."""
+    rng = random.Random(seed)
+    plan = [build_requests(name, dataset, rng)
+            for _ in range(count + warmup)]
+    for request in plan[:warmup]:
+        target.request(*request)
+    latencies, queries = [], []
+    errors = 0
+    lock = threading.Lock()
+
+    def send(request):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            status, query_count = target.request(*request)
+        except OSError:
+            status, query_count = None, None
+        latency = time.perf_counter() - started
+        with lock:
+            latencies.append(latency)
+            if status is None or status >= 400:
+                errors += 1
+            if query_count is not None:
+                queries.append(query_count)
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(send, plan[warmup:]))
+    else:
+        for request in plan[warmup:]:
+            send(request)
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, errors, queries)
+
+
+def run_benchmark(dataset, modes=('client', 'wsgi'), scenarios=SCENARIOS,
+                  count=100, concurrency=4, seed=0):
+    """Прогоняет сценарии во всех режимах: {режим: {сценарий: сводка}}."""
+    reader = User.objects.get(pk=dataset['reader_id'])
+    results = {}
+    for mode in modes:
+        if mode == 'client':
+            target, workers = ClientTarget(reader), 1
+        else:
+            target, workers = WSGITarget(reader), concurrency
+        try:
+            results[mode] = {
+                name: run_scenario(target, name, dataset, count,
+                                   concurrency=workers, seed=seed)
+                for name in scenarios
+            }
+        finally:
+            if hasattr(target, 'close'):
+                target.close()
+    return results
+
+
+def compare(baseline, current, metric='p95'):
+    """Изменение метрики задержки относительно прошлого прогона, в %."""
+    changes = {}
+    for mode, scenarios in current.items():
+        for name, summary in scenarios.items():
+            before = (baseline.get(mode, {}).get(name, {})
+                      .get('latency_ms', {}).get(metric))
+            after = summary['latency_ms'].get(metric)
+            if before and after is not None:
+                changes[f'{mode}/{name}'] = round(
+                    (after - before) / before * 100, 1)
+    return changes
@@ -0,0 +1,216 @@
+"""Кеш страниц лент с инвалидацией по сигналам.
+
+Ключ страницы содержит номер поколения, который увеличивается при любой
+записи постов и групп, поэтому TTL может быть долгим без устаревания.
+
+Карточки постов кешируются с версиями их автора и группы: правка
+пользователя или группы сдвигает одну версию вместо UPDATE всех постов.
+
+Для условных запросов у каждой ленты (`index`, `group:<id>`,
+`author:<id>`) хранится время последнего изменения; `all` меняется
+вместе со всеми лентами сразу. Это же время входит в ключ страницы,
+поэтому ETag и закешированная разметка сбрасываются одними сигналами.
+"""
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from core.cache import get_or_compute
+
+from .models import Group, User
+
+FEED_GENERATION_KEY = 'posts:feed_generation'
+
+
+def feed_generation():
+    generation = cache.get(FEED_GENERATION_KEY)
+    if generation is None:
+        # После вытеснения ключа нельзя начинать с 1: старые страницы
+        # с тем же поколением ещё могут лежать в кеше
+        cache.add(FEED_GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(FEED_GENERATION_KEY)
+    return generation
+
+
+def bump_feed_generation():
+    try:
+        cache.incr(FEED_GENERATION_KEY)
+    except ValueError:
+        feed_generation()
+
+
+def _card_version_key(owner):
+    return f'posts:card_version:{owner}'
+
+
+def bump_card_version(owner):
+    """Сбрасывает карточки постов автора (`author:<id>`) или группы."""
+    key = _card_version_key(owner)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Как и у поколения страниц: после вытеснения нельзя
+        # вернуться к уже использованному номеру
+        if not cache.add(key, int(time.time() * 1000), None):
+            # Версию только что завела attach_card_versions
+            cache.incr(key)
+
+
+def attach_card_versions(posts):
+    """Версии автора и группы для ключа кеша карточки, одним get_many."""
+    owners = []
+    for post in posts:
+        names = [f'author:{post.author_id}']
+        if post.group_id is not None:
+            names.append(f'group:{post.group_id}')
+        owners.append((post, names))
+    keys = {_card_version_key(owner)
+            for _, names in owners for owner in names}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # add, а не set: сдвиг версии между чтением и записью не теряется
+        now = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, now, None)
+        versions.update(cache.get_many(missing))
+    for post, names in owners:
+        post.card_version = '.'.join(
+            str(versions[_card_version_key(owner)]) for owner in names)
+
+
+def page_cache_key(request):
+    """Ключ страницы с поколением и временем изменения её лент.
+
+    Время берётся из `conditional_feed`, который оборачивает view
+    снаружи и уже посчитал его для ETag.
+    """
+    url = md5(request.build_absolute_uri().encode()).hexdigest()
+    modified = getattr(request, '_feed_modified', None)
+    return f'posts:page:{feed_generation()}:{modified}:{url}'
+
+
+def cache_feed_page(view_name):
+    """Кеширует страницу для гостей, если view_name в POST_PAGE_CACHE_VIEWS.
+
+    Авторизованные пользователи видят вкладки и кнопки подписки, поэтому
+    их страницы всегда рендерятся заново.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (view_name not in settings.POST_PAGE_CACHE_VIEWS
+                    or request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            return get_or_compute(
+                page_cache_key(request),
+                lambda: view(request, *args, **kwargs),
+                settings.TIME_CACHE,
+                cacheable=lambda response: (response.status_code == 200
+                                            and not response.cookies),
+            )
+        return wrapper
+    return decorator
+
+
+def _modified_key(feed):
+    return f'posts:feed_modified:{feed}'
+
+
+def post_feeds(author_id, group_id=None):
+    """Ленты, в которых показывается пост."""
+    feeds = ['index', f'author:{author_id}']
+    if group_id is not None:
+        feeds.append(f'group:{group_id}')
+    return feeds
+
+
+def touch_feeds(*feeds):
+    """Отмечает ленты изменёнными сейчас."""
+    now = time.time()
+    cache.set_many({_modified_key(feed): now for feed in feeds}, None)
+
+
+def group_feeds(request, slug):
+    """Лента страницы группы для `conditional_feed`."""
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    return None if group_id is None else [f'group:{group_id}']
+
+
+def author_feeds(request, username):
+    """Лента страницы автора для `conditional_feed`."""
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    return None if author_id is None else [f'author:{author_id}']
+
+
+def feeds_modified(*feeds):
+    """Время последнего изменения лент с учётом `all`.
+
+    Вытесненная из кеша отметка считается изменением в этот момент.
+    """
+    keys = [_modified_key(feed) for feed in ('all', *feeds)]
+    found = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in found:
+            cache.add(key, now, None)
+            found[key] = cache.get(key, now)
+    return max(found.values())
+
+
+def conditional_feed(get_feeds):
+    """Отдаёт 304 по Last-Modified/ETag ленты до запроса страницы.
+
+    `get_feeds(request, *args, **kwargs)` возвращает имена лент страницы
+    или None, если условный ответ невозможен (например, нет группы).
+    ETag слабый и включает пользователя: у авторизованных своя разметка,
+    поэтому их ответы помечаются private, а гостевые могут храниться
+    прокси с обязательной перепроверкой.
+    """
+    def versions(request, *args, **kwargs):
+        if not hasattr(request, '_feed_modified'):
+            feeds = get_feeds(request, *args, **kwargs)
+            request._feed_modified = (
+                None if feeds is None else feeds_modified(*feeds))
+        return request._feed_modified
+
+    def last_modified(request, *args, **kwargs):
+        modified = versions(request, *args, **kwargs)
+        # Last-Modified точен до секунды: правка в ту же секунду после
+        # ответа не сдвинула бы его и получила бы 304. Пока секунда не
+        # прошла, клиенту остаётся ETag
+        if modified is None or int(modified) >= int(time.time()):
+            return None
+        return datetime.fromtimestamp(int(modified), timezone.utc)
+
+    def etag(request, *args, **kwargs):
+        modified = versions(request, *args, **kwargs)
+        if modified is None:
+            return None
+        source = f'{request.get_full_path()}|{modified}|{request.user.pk}'
+        return f'W/"{md5(source.encode()).hexdigest()}"'
+
+    def decorator(view):
+        conditional_view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, max_age=0)
+            else:
+                patch_cache_control(response, public=True, max_age=0,
+                                    must_revalidate=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,209 @@
+"""Счётчики без COUNT(*) на горячем пути.
+
+Число постов хранится в `PostCounter` и сдвигается сигналами при
+сохранении и удалении постов. Отсутствующий счётчик считается один раз
+точно, а для огромной общей таблицы берётся оценка из статистики СУБД.
+Так же сигналами сдвигаются число комментариев поста и подписок
+пользователя; расхождения после записи в обход ORM исправляет команда
+reconcile_counters.
+"""
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import (Case, Count, F, Func, OuterRef, Subquery,
+                              When)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from users.models import Profile
+
+from .models import Comment, Follow, Post, PostCounter
+
+GLOBAL_KEY = 'all'
+
+
+def counter_keys(author_id=None, group_id=None, total=True):
+    """Ключи всех счётчиков, которые затрагивает пост."""
+    keys = [GLOBAL_KEY] if total else []
+    if author_id is not None:
+        keys.append(f'author:{author_id}')
+    if group_id is not None:
+        keys.append(f'group:{group_id}')
+    return keys
+
+
+def approximate_count(model):
+    """Оценка числа строк таблицы по статистике СУБД или None."""
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ('SELECT reltuples::bigint FROM pg_class '
+                       'WHERE relname = %s'),
+        'mysql': ('SELECT table_rows FROM information_schema.tables '
+                  'WHERE table_schema = DATABASE() AND table_name = %s'),
+        # Таблица появляется только после ANALYZE
+        'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(queries[connection.vendor], [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    try:
+        return int(str(row[0]).split()[0])
+    except ValueError:
+        return None
+
+
+def count_subquery(queryset):
+    """COUNT(*) по queryset как подзапрос для UPDATE."""
+    return Subquery(queryset.order_by().annotate(
+        total=Func(F('pk'), function='COUNT')).values('total'))
+
+
+def post_count(author=None, group=None):
+    """Число постов всего, у автора или в группе."""
+    author_id = author.pk if author is not None else None
+    group_id = group.pk if group is not None else None
+    key = counter_keys(author_id, group_id)[-1]
+    value = PostCounter.objects.filter(key=key).values_list(
+        'value', flat=True).first()
+    if value is not None:
+        return value
+    if key == GLOBAL_KEY:
+        estimate = approximate_count(Post)
+        if (estimate is not None
+                and estimate >= settings.POST_COUNT_APPROXIMATE_FROM):
+            return estimate
+    posts = Post.objects.all()
+    if author_id is not None:
+        posts = posts.filter(author_id=author_id)
+    if group_id is not None:
+        posts = posts.filter(group_id=group_id)
+    # Сначала заводится строка, потом она заполняется одним UPDATE:
+    # пост, сохранённый между ними, либо уже попал в подсчёт, либо
+    # сдвинет заведённый счётчик, и ни один не теряется
+    PostCounter.objects.bulk_create([PostCounter(key=key)],
+                                    ignore_conflicts=True)
+    PostCounter.objects.filter(key=key).update(value=count_subquery(posts))
+    return PostCounter.objects.filter(key=key).values_list(
+        'value', flat=True).get()
+
+
+def shift_counters(delta, author_id=None, group_id=None, total=True):
+    """Атомарно сдвигает уже заведённые счётчики на delta."""
+    PostCounter.objects.filter(
+        key__in=counter_keys(author_id, group_id, total)
+    ).update(value=F('value') + delta)
+
+
+def drop_group_counter(group_id):
+    """Удаляет счётчик группы: при её удалении посты отвязываются
+    UPDATE в обход сигналов."""
+    PostCounter.objects.filter(
+        key__in=counter_keys(group_id=group_id, total=False)).delete()
+
+
+def drop_total_counter():
+    """Удаляет общий счётчик после записи постов в обход сигналов."""
+    PostCounter.objects.filter(key=GLOBAL_KEY).delete()
+
+
+def reset_counters():
+    """Сбрасывает счётчики после массовых операций в обход сигналов."""
+    PostCounter.objects.all().delete()
+
+
+def _shifted(field, delta):
+    return Greatest(F(field) + delta, 0)
+
+
+def shift_comments(post_id, delta):
+    """Атомарно сдвигает число комментариев поста, не ниже нуля.
+
+    Дата изменения поста обновляется, чтобы сбросить кеш его карточки.
+    """
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shifted('comments_count', delta),
+        updated=timezone.now()
+    )
+
+
+def user_profile(user):
+    """Профиль со счётчиками подписок; отсутствующий считается точно."""
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        pass
+    # Как и у счётчиков постов: строка заводится до подсчёта, чтобы
+    # подписка между ними не потерялась
+    Profile.objects.bulk_create([Profile(user=user)], ignore_conflicts=True)
+    Profile.objects.filter(user=user).update(
+        followers_count=count_subquery(Follow.objects.filter(author=user)),
+        following_count=count_subquery(Follow.objects.filter(user=user)),
+    )
+    profile = Profile.objects.get(user=user)
+    user.profile = profile
+    return profile
+
+
+def shift_follows(user_id, author_id, delta):
+    """Атомарно сдвигает уже заведённые счётчики подписок одним UPDATE.
+
+    Разошедшийся с подписками счётчик не уходит ниже нуля.
+    """
+    Profile.objects.filter(user_id__in=[user_id, author_id]).update(
+        following_count=Case(
+            When(user_id=user_id,
+                 then=_shifted('following_count', delta)),
+            default=F('following_count')),
+        followers_count=Case(
+            When(user_id=author_id,
+                 then=_shifted('followers_count', delta)),
+            default=F('followers_count')),
+    )
+
+
+def count_comments(posts):
+    """Пересчитывает число комментариев постов queryset одним UPDATE."""
+    posts.update(comments_count=count_subquery(
+        Comment.objects.filter(post=OuterRef('pk'))))
+
+
+def reconcile_counters():
+    """Пересчитывает все счётчики одним UPDATE на таблицу.
+
+    Возвращает число исправленных строк по каждому счётчику.
+    """
+    comments = Coalesce(Subquery(
+        Comment.objects.filter(post=OuterRef('pk')).order_by()
+        .values('post').annotate(total=Count('pk')).values('total')
+    ), 0)
+    followers = Coalesce(Subquery(
+        Follow.objects.filter(author=OuterRef('user')).order_by()
+        .values('author').annotate(total=Count('pk')).values('total')
+    ), 0)
+    following = Coalesce(Subquery(
+        Follow.objects.filter(user=OuterRef('user')).order_by()
+        .values('user').annotate(total=Count('pk')).values('total')
+    ), 0)
+    drift = {
+        'comments': Post.objects.annotate(actual=comments).exclude(
+            comments_count=F('actual')).count(),
+        'followers': Profile.objects.annotate(actual=followers).exclude(
+            followers_count=F('actual')).count(),
+        'following': Profile.objects.annotate(actual=following).exclude(
+            following_count=F('actual')).count(),
+        'posts': PostCounter.objects.count(),
+    }
+    if drift['comments']:
+        Post.objects.update(comments_count=comments)
+    if drift['followers'] or drift['following']:
+        Profile.objects.update(followers_count=followers,
+                               following_count=following)
+    # Счётчики постов проще завести заново точным подсчётом
+    reset_counters()
+    return drift
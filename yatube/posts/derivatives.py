@@ -0,0 +1,141 @@
+"""Адаптивные копии картинок постов для <picture> и srcset.
+
+Для каждой ширины из POST_IMAGE_WIDTHS картинка кадрируется под
+пропорции карточки и сохраняется во всех форматах POST_IMAGE_FORMATS,
+которые умеет записывать установленный Pillow (AVIF и WebP требуют
+соответствующих кодеков).
+"""
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from PIL import Image, ImageOps
+
+from .models import ImageDerivative, Post
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+FALLBACK_FORMAT = 'jpeg'
+
+logger = logging.getLogger(__name__)
+
+
+def supported_formats():
+    Image.init()
+    return [image_format for image_format in settings.POST_IMAGE_FORMATS
+            if image_format.upper() in Image.SAVE]
+
+
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+
+def normalize_original(post):
+    """Уменьшает слишком большой оригинал и вырезает из него метаданные.
+
+    Файл перезаписывается под новым именем, старый удаляется.
+    """
+    try:
+        with post.image.open('rb') as file:
+            image = Image.open(file)
+            if getattr(image, 'is_animated', False):
+                return
+            image.load()
+    except OSError:
+        return
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    oversized = max(image.size) > max_side
+    has_metadata = any(key in image.info for key in METADATA_KEYS)
+    if not oversized and not has_metadata:
+        return
+    image_format = image.format
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    if oversized:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    options = {'icc_profile': icc_profile} if icc_profile else {}
+    if image_format == 'JPEG':
+        options['quality'] = 90
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    storage = post.image.storage
+    old_name = post.image.name
+    # Новый FieldFile: старый держит закрытый файл прежнего оригинала
+    post.image = storage.save(old_name, ContentFile(buffer.getvalue()))
+    Post.objects.filter(pk=post.pk).update(image=post.image.name)
+    storage.delete(old_name)
+
+
+def delete_derivatives(post):
+    """Удаляет копии картинки; файлы убирает сигнал post_delete."""
+    ImageDerivative.objects.filter(post=post).delete()
+
+
+def delete_derivative_file(derivative):
+    """Удаляет файл копии после коммита: откат оставит строку с файлом."""
+    storage, name = derivative.image.storage, derivative.image.name
+    if name:
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def generate_derivatives(post):
+    """Пересоздаёт все копии картинки поста."""
+    delete_derivatives(post)
+    if not post.image:
+        return
+    try:
+        with post.image.open('rb') as file:
+            source = Image.open(file)
+            source.load()
+    except OSError:
+        logger.warning('Картинка поста %s не читается', post.pk)
+        return
+    source = ImageOps.exif_transpose(source).convert('RGB')
+    ratio = settings.POST_IMAGE_ASPECT_RATIO
+    # Больше исходника растягивать незачем, кроме самой узкой копии
+    widths = [width for width in settings.POST_IMAGE_WIDTHS
+              if width <= source.width] or settings.POST_IMAGE_WIDTHS[:1]
+    derivatives = []
+    for width in widths:
+        resized = ImageOps.fit(source, (width, round(width / ratio)),
+                               Image.LANCZOS)
+        for image_format in supported_formats():
+            buffer = BytesIO()
+            resized.save(buffer, image_format.upper(),
+                         quality=settings.POST_IMAGE_QUALITY)
+            derivative = ImageDerivative(post=post, width=width,
+                                         format=image_format)
+            derivative.image.save(
+                f'{post.pk}-{width}.{image_format}',
+                ContentFile(buffer.getvalue()),
+                save=False
+            )
+            derivatives.append(derivative)
+    ImageDerivative.objects.bulk_create(derivatives)
+
+
+def attach_derivatives(posts):
+    """Загружает копии картинок всех постов одним запросом."""
+    prefetch_related_objects(list(posts), 'derivatives')
+
+
+def picture_sources(post):
+    """Источники для <picture>: современные форматы и srcset запасного."""
+    srcsets = {}
+    for derivative in post.derivatives.all():
+        srcsets.setdefault(derivative.format, []).append(
+            f'{derivative.image.url} {derivative.width}w')
+    return {
+        'modern': [
+            {'type': MIME_TYPES[image_format],
+             'srcset': ', '.join(srcsets[image_format])}
+            for image_format in MIME_TYPES
+            if image_format != FALLBACK_FORMAT and image_format in srcsets
+        ],
+        'fallback': ', '.join(srcsets.get(FALLBACK_FORMAT, [])),
+    }
@@ -0,0 +1,148 @@
+"""Письма-дайджесты подписчикам о новых постах их авторов.
+
+Периодический запуск берёт окно публикаций от конца прошлой успешной
+рассылки до `now - DIGEST_LAG` и собирает новые посты сразу для всех
+получателей прямо по подпискам: материализованные ленты заполняет
+очередь, и к концу окна она может не успеть. Одновременно идёт только
+один запуск.
+Карточка каждого поста рендерится один раз и вставляется во все письма,
+а письма уходят пачками через одно соединение с почтовым сервером.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .models import DigestRun, Follow, Post, User
+
+
+def window_start(until):
+    """Конец окна прошлой завершённой рассылки или DIGEST_INTERVAL назад.
+
+    Окно упавшей рассылки повторяется целиком: лучше повтор письма,
+    чем потерянные посты.
+    """
+    last = DigestRun.objects.filter(finished__isnull=False).values_list(
+        'until', flat=True).first()
+    return last or until - timedelta(seconds=settings.DIGEST_INTERVAL)
+
+
+def start_run(until):
+    """Запись о новом запуске или None, если другой ещё не завершён.
+
+    Запуск, не закончившийся за DIGEST_RUN_TIMEOUT, считается упавшим.
+    Строка последнего запуска блокируется, чтобы два процесса не начали
+    одно окно одновременно; SQLite и так выполняет записи по очереди.
+    """
+    started_after = timezone.now() - timedelta(
+        seconds=settings.DIGEST_RUN_TIMEOUT)
+    with transaction.atomic():
+        list(DigestRun.objects.select_for_update()[:1])
+        if DigestRun.objects.filter(finished__isnull=True,
+                                    started__gt=started_after).exists():
+            return None
+        return DigestRun.objects.create(since=window_start(until),
+                                        until=until)
+
+
+def collect(since, until):
+    """{id получателя: множество id постов} за окно (since, until]."""
+    posts = defaultdict(list)
+    for post_id, author_id in Post.objects.filter(
+            pub_date__gt=since, pub_date__lte=until).values_list(
+            'pk', 'author_id').order_by():
+        posts[author_id].append(post_id)
+    recipients = defaultdict(set)
+    for user_id, author_id in Follow.objects.filter(
+            author_id__in=list(posts)).values_list('user_id', 'author_id'):
+        recipients[user_id].update(posts[author_id])
+    return recipients
+
+
+def render_posts(posts, site_url):
+    """Текстовая и HTML-карточки каждого поста, по одному рендеру."""
+    text = get_template('posts/email/digest_post.txt')
+    html = get_template('posts/email/digest_post.html')
+    cards = {}
+    for post in posts.values():
+        context = {'post': post, 'site_url': site_url}
+        cards[post.pk] = (text.render(context),
+                          mark_safe(html.render(context)))
+    return cards
+
+
+def build_messages(recipients, users, posts, cards, connection, site_url):
+    """Письма получателям; шаблоны загружаются один раз."""
+    text = get_template('posts/email/digest.txt')
+    html = get_template('posts/email/digest.html')
+    limit = settings.DIGEST_MAX_POSTS
+    for user_id, post_ids in recipients.items():
+        user = users.get(user_id)
+        if user is None:
+            continue
+        ordered = sorted((posts[pk] for pk in post_ids if pk in posts),
+                         key=lambda post: (post.pub_date, post.pk),
+                         reverse=True)
+        if not ordered:
+            continue
+        context = {
+            'user': user,
+            'total': len(ordered),
+            'more': max(len(ordered) - limit, 0),
+            'site_url': site_url,
+        }
+        shown = [cards[post.pk] for post in ordered[:limit]]
+        message = EmailMultiAlternatives(
+            subject=f'Новые посты ваших авторов: {len(ordered)}',
+            body=text.render({**context, 'cards': [
+                card for card, _ in shown]}),
+            to=[user.email],
+            connection=connection,
+        )
+        message.attach_alternative(
+            html.render({**context, 'cards': [card for _, card in shown]}),
+            'text/html')
+        yield message
+
+
+def send_digests(now=None):
+    """Рассылает дайджесты за новое окно и возвращает запись о запуске.
+
+    Если предыдущий запуск ещё идёт, возвращает None.
+    """
+    until = (now or timezone.now()) - timedelta(seconds=settings.DIGEST_LAG)
+    run = start_run(until)
+    if run is None:
+        return None
+    recipients = collect(run.since, run.until)
+    # in_bulk делит длинный список id на пачки под лимит параметров СУБД
+    users = {pk: user for pk, user in User.objects.in_bulk(
+        list(recipients)).items() if user.is_active and user.email}
+    post_ids = {pk for user_id in users for pk in recipients[user_id]}
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        list(post_ids))
+    site_url = settings.DIGEST_SITE_URL
+    cards = render_posts(posts, site_url)
+    sent = 0
+    batch = []
+    # Одно соединение на весь запуск вместо соединения на письмо
+    with get_connection() as connection:
+        for message in build_messages(recipients, users, posts, cards,
+                                      connection, site_url):
+            batch.append(message)
+            if len(batch) >= settings.DIGEST_BATCH_SIZE:
+                sent += connection.send_messages(batch) or 0
+                batch = []
+        if batch:
+            sent += connection.send_messages(batch) or 0
+    run.recipients = len(users)
+    run.posts = len(posts)
+    run.sent = sent
+    run.finished = timezone.now()
+    run.save()
+    return run
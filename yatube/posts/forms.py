@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.forms import ModelForm
 
 from .models import Post, Comment
@@ -8,6 +10,28 @@ class PostForm(ModelForm):
         model = Post
         fields = ['text', 'group', 'image']
 
+    def clean_image(self):
+        """Проверяет размер и формат по заголовку, не декодируя картинку.
+
+        ImageField уже открыл файл через Image.open, который читает только
+        заголовок, так что ширина, высота и формат известны без распаковки.
+        """
+        image = self.cleaned_data.get('image')
+        if not image or not hasattr(image, 'image'):
+            return image
+        if image.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            raise ValidationError(
+                'Файл больше %(limit)s МБ',
+                params={
+                    'limit': settings.POST_IMAGE_MAX_UPLOAD_SIZE // 2 ** 20},
+            )
+        if image.image.format not in settings.POST_IMAGE_UPLOAD_FORMATS:
+            raise ValidationError('Неподдерживаемый формат картинки')
+        width, height = image.image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError('Слишком большое разрешение картинки')
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,125 @@
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts.benchmark import SCENARIOS, compare, run_benchmark, seed
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон страниц на синтетических данных '
+            'во временной базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--groups', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument('--comments', type=int, default=500)
+        parser.add_argument('--follows', type=int, default=5,
+                            help='на скольких авторов подписан каждый '
+                                 'пользователь, включая читателя ленты')
+        parser.add_argument('--images', type=float, default=0.3,
+                            help='доля постов с картинкой')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='запросов на сценарий')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='параллельных клиентов WSGI-сервера')
+        parser.add_argument('--mode', choices=('client', 'wsgi', 'both'),
+                            default='both')
+        parser.add_argument('--scenario', action='append',
+                            choices=SCENARIOS, dest='scenarios')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='файл для JSON с результатом')
+        parser.add_argument('--compare', help='JSON прошлого прогона')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='yatube-bench-')
+        # Прогон не трогает рабочую базу, медиа и кеш
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            workdir, 'db.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                           serialize=False)
+        cache = {**settings.CACHES['default'],
+                 'METERED_BACKEND': 'core.cache.SQLiteCache',
+                 'LOCATION': os.path.join(workdir, 'cache.sqlite3')}
+        try:
+            # Реплики из YATUBE_DB_REPLICAS смотрят в рабочие данные, а
+            # запросы к ним не видит CaptureQueriesContext для default.
+            # Задачи выполняются в запросе: воркера у прогона нет, а без
+            # этого результат зависел бы от DEBUG и YATUBE_TASKS_EAGER
+            with override_settings(DEBUG=False, CACHES={'default': cache},
+                                   MEDIA_ROOT=os.path.join(workdir, 'media'),
+                                   THUMBNAIL_ASYNC=False,
+                                   TASKS_EAGER=True,
+                                   DATABASE_REPLICAS=[]):
+                report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+        self.print_report(report['results'])
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)['results']
+            for name, change in compare(baseline,
+                                        report['results']).items():
+                self.stdout.write(f'{name}: p95 {change:+.1f}%')
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def run(self, options):
+        config = {key: options[key] for key in (
+            'users', 'groups', 'posts', 'comments', 'follows', 'images',
+            'requests', 'concurrency', 'seed')}
+        started = time.perf_counter()
+        dataset = seed(users=options['users'], groups=options['groups'],
+                       posts=options['posts'], comments=options['comments'],
+                       follows=options['follows'], images=options['images'],
+                       seed=options['seed'])
+        seeded = time.perf_counter() - started
+        modes = (('client', 'wsgi') if options['mode'] == 'both'
+                 else (options['mode'],))
+        results = run_benchmark(
+            dataset, modes=modes,
+            scenarios=options['scenarios'] or SCENARIOS,
+            count=options['requests'], concurrency=options['concurrency'],
+            seed=options['seed'])
+        return {
+            'meta': {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['METERED_BACKEND'],
+                'tasks_eager': settings.TASKS_EAGER,
+                'seed_seconds': round(seeded, 2),
+                'config': config,
+            },
+            'results': results,
+        }
+
+    def print_report(self, results):
+        header = (f'{"сценарий":<22}{"rps":>9}{"p50":>9}{"p95":>9}'
+                  f'{"p99":>9}{"SQL":>7}{"ошибки":>8}')
+        for mode, scenarios in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(mode))
+            self.stdout.write(header)
+            for name, summary in scenarios.items():
+                latency = summary['latency_ms']
+                queries = summary.get('queries', {}).get('mean', '-')
+                self.stdout.write(
+                    f'{name:<22}{summary["throughput_rps"]:>9}'
+                    f'{latency.get("p50", "-"):>9}'
+                    f'{latency.get("p95", "-"):>9}'
+                    f'{latency.get("p99", "-"):>9}'
+                    f'{queries:>7}{summary["errors"]:>8}'
+                )
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from posts.models import Comment, Group, Post, User
+from posts.timeline import timeline_posts
+
+
+def first_pk(model):
+    return model.objects.order_by('pk').values_list('pk', flat=True).first()
+
+
+class Command(BaseCommand):
+    help = 'Печатает планы выполнения запросов лент и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='id читателя и автора')
+        parser.add_argument('--group', type=int, help='id группы')
+        parser.add_argument('--post', type=int, help='id поста')
+        parser.add_argument('--analyze', action='store_true',
+                            help='сначала обновить статистику СУБД')
+
+    def feed_queries(self, user_id, group_id, post_id):
+        per_page = settings.POST_PER_PAGE
+        feed = Post.objects.select_related('author', 'group')
+        # Позиция курсора не важна для плана, важен сам предикат
+        now = timezone.now()
+        after = Q(pub_date__lt=now) | Q(pub_date=now, pk__lt=post_id)
+        return {
+            'index': feed[:per_page],
+            'index (курсор)': feed.filter(
+                after, pub_date__lte=now)[:per_page + 1],
+            'profile': feed.filter(author_id=user_id)[:per_page],
+            'group_posts': Post.objects.select_related('author').filter(
+                group_id=group_id)[:per_page],
+            'follow_index': timeline_posts(User(pk=user_id)).select_related(
+                'author', 'group')[:per_page],
+            'post_detail (комментарии)': Comment.objects.select_related(
+                'author').filter(
+                post_id=post_id)[:settings.COMMENTS_PER_PAGE],
+        }
+
+    def handle(self, *args, **options):
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        user_id = options['user'] or first_pk(User) or 1
+        group_id = options['group'] or first_pk(Group) or 1
+        post_id = options['post'] or first_pk(Post) or 1
+        queries = self.feed_queries(user_id, group_id, post_id)
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain())
+            self.stdout.write('')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Нарезает миниатюры для уже загруженных картинок постов'
+
+    def handle(self, *args, **options):
+        post_ids = Post.objects.exclude(image='').values_list('pk', flat=True)
+        done = 0
+        for post_id in post_ids.iterator():
+            generate_thumbnails(post_id)
+            done += 1
+        self.stdout.write(f'Готово: {done} постов')
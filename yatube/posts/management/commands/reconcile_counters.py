@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters()
+        self.stdout.write(
+            f'Исправлено: комментарии {drift["comments"]}, '
+            f'подписчики {drift["followers"]}, '
+            f'подписки {drift["following"]}; '
+            f'сброшено счётчиков постов: {drift["posts"]}'
+        )
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.seeding import seed_database
+
+
+class Command(BaseCommand):
+    help = 'Быстро заполняет базу синтетическими пользователями и постами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=3000)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='подписок на пользователя')
+        parser.add_argument('--images', type=float, default=0.0,
+                            help='доля постов с картинкой')
+        parser.add_argument('--days', type=int, default=365,
+                            help='за сколько дней разбросаны даты')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed',
+                            help='префикс имён пользователей и групп')
+        parser.add_argument('--password',
+                            help='общий пароль пользователей для входа')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = {}
+
+        def progress(label, done):
+            if not done:
+                started[label] = time.perf_counter()
+                return
+            elapsed = time.perf_counter() - started[label]
+            rate = f'{done / elapsed:,.0f}/с' if elapsed else '-'
+            self.stdout.write(f'{label}: {done:,} ({rate})')
+
+        result = seed_database(
+            users=options['users'], groups=options['groups'],
+            posts=options['posts'], comments=options['comments'],
+            follows=options['follows'], images=options['images'],
+            days=options['days'], seed=options['seed'],
+            prefix=options['prefix'], password=options['password'],
+            batch_size=options['batch_size'], progress=progress,
+        )
+        for stage, seconds in result['timings'].items():
+            self.stdout.write(f'{stage:<10} {seconds:>8.2f} с')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {sum(result["timings"].values()):.2f} с'))
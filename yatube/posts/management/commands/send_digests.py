@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.digests import send_digests
+from posts.tasks import send_digests as send_digests_task
+
+
+class Command(BaseCommand):
+    help = ('Рассылает подписчикам дайджесты новых постов; '
+            'запускается по расписанию, например из cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='store_true',
+                            help='поставить рассылку в фоновую очередь')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            send_digests_task.delay()
+            return
+        run = send_digests()
+        if run is None:
+            self.stdout.write('Предыдущая рассылка ещё не завершена')
+            return
+        self.stdout.write(
+            f'{run}: получателей {run.recipients}, постов {run.posts}, '
+            f'писем {run.sent}')
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('format', models.CharField(max_length=10, verbose_name='Формат')),
+                ('image', models.ImageField(upload_to='posts/derivatives/')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='posts.Post')),
+            ],
+            options={
+                'ordering': ['width'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='imagederivative',
+            constraint=models.UniqueConstraint(fields=('post', 'format', 'width'), name='unique_image_derivative'),
+        ),
+    ]
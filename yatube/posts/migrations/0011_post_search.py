@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:10
+
+from django.db import migrations
+
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE posts_search USING fts5("
+    "post, comment, post_id UNINDEXED, "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+FILL_POSTS = (
+    "INSERT INTO posts_search (rowid, post, comment, post_id) "
+    "SELECT id * 2, text, '', id FROM posts_post"
+)
+FILL_COMMENTS = (
+    "INSERT INTO posts_search (rowid, post, comment, post_id) "
+    "SELECT id * 2 + 1, '', text, post_id FROM posts_comment"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX)
+    schema_editor.execute(FILL_POSTS)
+    schema_editor.execute(FILL_COMMENTS)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_imagederivative'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_comments(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    counts = Post.objects.order_by().annotate(
+        counted=Count('comments')).filter(counted__gt=0)
+    for post in counts.iterator():
+        Post.objects.filter(pk=post.pk).update(comments_count=post.counted)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_comments_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since', models.DateTimeField(verbose_name='Начало окна')),
+                ('until', models.DateTimeField(verbose_name='Конец окна')),
+                ('started', models.DateTimeField(auto_now_add=True, verbose_name='Начат')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершён')),
+                ('recipients', models.PositiveIntegerField(default=0, verbose_name='Получателей')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='Отправлено писем')),
+            ],
+            options={
+                'verbose_name': 'Рассылка дайджестов',
+                'verbose_name_plural': 'Рассылки дайджестов',
+                'ordering': ['-until'],
+            },
+        ),
+    ]
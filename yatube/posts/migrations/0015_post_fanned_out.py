@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_fanned_out(apps, schema_editor):
+    """Посты авторов без статуса знаменитости уже лежат в лентах."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    celebrities = Follow.objects.values('author_id').annotate(
+        followers=Count('pk')).filter(
+        followers__gte=settings.TIMELINE_FANOUT_LIMIT).values('author_id')
+    Post.objects.exclude(author_id__in=celebrities).update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_digest_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=False, verbose_name='Разослан по лентам'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(fanned_out=False), fields=['author', '-pub_date', '-id'], name='post_unfanned_idx'),
+        ),
+        migrations.RunPython(mark_fanned_out, migrations.RunPython.noop),
+    ]
@@ -23,6 +23,10 @@ class Post (models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
                                verbose_name='Автор',
@@ -39,14 +43,36 @@ class Post (models.Model):
         verbose_name='Картинка',
         help_text='Загрузите картинку'
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0
+    )
+    # Пост разложен по лентам подписчиков; остальные подмешиваются
+    # при чтении ленты независимо от того, сколько подписчиков у автора
+    fanned_out = models.BooleanField(
+        'Разослан по лентам',
+        default=False
+    )
 
     def __str__(self) -> str:
         return self.text[:15]
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты сортируются по (pub_date, id), в том числе курсорные
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_unfanned_idx',
+                         condition=models.Q(fanned_out=False)),
+        ]
 
 
 class Comment(models.Model):
@@ -69,6 +95,10 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий '
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text
@@ -93,3 +123,84 @@ class Follow(models.Model):
                 name='unique_follow'
             )
         ]
+
+
+class PostCounter(models.Model):
+    """Денормализованный счётчик постов: всего, по автору, по группе."""
+    key = models.CharField(max_length=64, unique=True)
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Счётчик постов'
+        verbose_name_plural = 'Счётчики постов'
+
+    def __str__(self):
+        return f'{self.key}: {self.value}'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='timeline_user_date_idx'),
+        ]
+
+
+class ImageDerivative(models.Model):
+    """Уменьшенная копия картинки поста в одной ширине и формате."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='derivatives'
+    )
+    width = models.PositiveIntegerField('Ширина')
+    format = models.CharField('Формат', max_length=10)
+    image = models.ImageField(upload_to='posts/derivatives/')
+
+    class Meta:
+        ordering = ['width']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'format', 'width'],
+                name='unique_image_derivative'
+            )
+        ]
+
+
+class DigestRun(models.Model):
+    """Запуск рассылки дайджестов за окно публикаций (since, until]."""
+    since = models.DateTimeField('Начало окна')
+    until = models.DateTimeField('Конец окна')
+    started = models.DateTimeField('Начат', auto_now_add=True)
+    finished = models.DateTimeField('Завершён', null=True, blank=True)
+    recipients = models.PositiveIntegerField('Получателей', default=0)
+    posts = models.PositiveIntegerField('Постов', default=0)
+    sent = models.PositiveIntegerField('Отправлено писем', default=0)
+
+    class Meta:
+        ordering = ['-until']
+        verbose_name = 'Рассылка дайджестов'
+        verbose_name_plural = 'Рассылки дайджестов'
+
+    def __str__(self):
+        return f'{self.since:%d.%m.%Y %H:%M} — {self.until:%d.%m.%Y %H:%M}'
@@ -0,0 +1,171 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Бэкенд выбирается настройкой POST_SEARCH_BACKEND. Локально это индекс
+SQLite FTS5: пост и каждый его комментарий — отдельные строки, найденные
+строки сворачиваются в посты с лучшим рангом bm25. На других СУБД
+используется простой поиск через icontains.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+FTS_TABLE = 'posts_search'
+# Совпадение в тексте поста весит больше, чем в комментарии
+POST_WEIGHT = 2.0
+COMMENT_WEIGHT = 1.0
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def _post_row(post_id):
+    return post_id * 2
+
+
+def _comment_row(comment_id):
+    return comment_id * 2 + 1
+
+
+class BaseSearchBackend:
+    """Интерфейс бэкенда поиска."""
+
+    def search(self, query, limit):
+        """Id постов по убыванию релевантности, не больше limit."""
+        raise NotImplementedError
+
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def index_comment(self, comment):
+        pass
+
+    def remove_comment(self, comment_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def index_new(self, posts, comments):
+        """Добавляет в индекс записанные в обход сигналов строки."""
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Поиск без индекса: LIKE по постам и комментариям."""
+
+    def search(self, query, limit):
+        words = TOKEN_RE.findall(query)
+        if not words:
+            return []
+        condition = Q()
+        for word in words:
+            condition &= (Q(text__icontains=word)
+                          | Q(comments__text__icontains=word))
+        return list(
+            Post.objects.filter(condition).distinct()
+            .values_list('pk', flat=True)[:limit]
+        )
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Индекс SQLite FTS5 с ранжированием bm25."""
+
+    @staticmethod
+    def match_expression(query):
+        """Запрос пользователя как выражение FTS5: все слова, последнее —
+        по префиксу. Кавычки не дают пользователю писать операторы FTS5.
+        """
+        words = [f'"{word}"' for word in TOKEN_RE.findall(query)]
+        if not words:
+            return None
+        words[-1] += '*'
+        return ' '.join(words)
+
+    def search(self, query, limit):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s',
+                [expression, POST_WEIGHT, COMMENT_WEIGHT, limit]
+            )
+            # Пост мог найтись и сам, и по комментариям: берём лучший ранг
+            return list(dict.fromkeys(row[0] for row in cursor.fetchall()))
+
+    def _replace(self, rowid, post_text, comment_text, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [rowid])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, post, comment, post_id) '
+                f'VALUES (%s, %s, %s, %s)',
+                [rowid, post_text, comment_text, post_id]
+            )
+
+    def _delete(self, rowid):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [rowid])
+
+    def index_post(self, post):
+        self._replace(_post_row(post.pk), post.text, '', post.pk)
+
+    def remove_post(self, post_id):
+        self._delete(_post_row(post_id))
+
+    def index_comment(self, comment):
+        self._replace(_comment_row(comment.pk), '', comment.text,
+                      comment.post_id)
+
+    def remove_comment(self, comment_id):
+        self._delete(_comment_row(comment_id))
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, post, comment, post_id) '
+                f'SELECT id * 2, text, \'\', id FROM posts_post'
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, post, comment, post_id) '
+                f'SELECT id * 2 + 1, \'\', text, post_id FROM posts_comment'
+            )
+
+    def index_new(self, posts, comments):
+        posts_sql, posts_params = posts.order_by().values(
+            'pk').query.sql_with_params()
+        comments_sql, comments_params = comments.order_by().values(
+            'pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, post, comment, post_id) '
+                f'SELECT id * 2, text, \'\', id FROM posts_post '
+                f'WHERE id IN ({posts_sql})', posts_params
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, post, comment, post_id) '
+                f'SELECT id * 2 + 1, \'\', text, post_id FROM posts_comment '
+                f'WHERE id IN ({comments_sql})', comments_params
+            )
+
+
+def get_backend():
+    backend_class = import_string(settings.POST_SEARCH_BACKEND)
+    # Таблица FTS5 создаётся миграцией только на SQLite
+    if (issubclass(backend_class, SQLiteFTSBackend)
+            and connection.vendor != 'sqlite'):
+        backend_class = SimpleSearchBackend
+    return backend_class()
+
+
+def search_post_ids(query):
+    return get_backend().search(query, settings.POST_SEARCH_LIMIT)
@@ -0,0 +1,226 @@
+"""Быстрое заполнение базы синтетическими данными.
+
+Объекты пишутся `bulk_create` пачками, поэтому сигналы не срабатывают:
+после записи счётчики, ленты подписок и поисковый индекс достраиваются
+только для новых строк. Новые пользователи подписаны лишь друг на
+друга, поэтому чужие ленты и счётчики не меняются. Содержимое зависит
+только от размеров и зерна.
+
+Модуль для команды seed_yatube и тестов: на время записи он отключает
+auto_now у полей дат во всём процессе и не должен вызываться из кода
+запросов.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image
+
+from . import counters, search, timeline
+from .cache import bump_feed_generation, touch_feeds
+from .models import Comment, Follow, Group, Post, User
+
+# Даты отсчитываются от фиксированного момента, чтобы прогоны совпадали
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+WORDS = (
+    'ведьмак меч серебро чудовище контракт тракт корчма дорога лес '
+    'болото замок чародейка портал эликсир знак аард игни квен ирден '
+    'аксий плотва гвинт краснолюд эльф король война мир песня лютня '
+    'оплата монета заказ деревня туман ночь луна зима весна охота'
+).split()
+IMAGE_POOL_SIZE = 16
+_dates_lock = threading.Lock()
+
+
+@contextmanager
+def _manual_dates(*fields):
+    """Отключает auto_now/auto_now_add, чтобы записать свои даты.
+
+    Поля общие для процесса: блокировка не даёт двум заполнениям
+    восстановить чужие значения.
+    """
+    with _dates_lock:
+        saved = [(field, field.auto_now, field.auto_now_add)
+                 for field in fields]
+        try:
+            for field in fields:
+                field.auto_now = field.auto_now_add = False
+            yield
+        finally:
+            for field, auto_now, auto_now_add in saved:
+                field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def make_text(rng, low, high):
+    return ' '.join(rng.choice(WORDS)
+                    for _ in range(rng.randint(low, high))).capitalize()
+
+
+def make_images(rng, prefix, count=IMAGE_POOL_SIZE):
+    """Небольшой пул картинок, общий для всех постов с картинкой."""
+    names = []
+    for index in range(count):
+        buffer = BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (1280, 720), color).save(buffer, 'JPEG',
+                                                  quality=80)
+        names.append(default_storage.save(
+            f'posts/{prefix}-{index}.jpg', ContentFile(buffer.getvalue())))
+    return names
+
+
+def _bulk(model, objects, batch_size, label, progress, **kwargs):
+    """bulk_create пачками с отчётом о ходе записи."""
+    batch = []
+    done = 0
+    progress(label, done)
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch, **kwargs)
+            done += len(batch)
+            batch = []
+            progress(label, done)
+    if batch:
+        model.objects.bulk_create(batch, **kwargs)
+        done += len(batch)
+        progress(label, done)
+    return done
+
+
+def _new_ids(model, after):
+    return list(model.objects.filter(pk__gt=after).order_by('pk')
+                .values_list('pk', flat=True))
+
+
+def _last_id(model):
+    return model.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+
+
+def _posts(rng, count, user_ids, group_ids, image_names, images, span):
+    for _ in range(count):
+        pub_date = EPOCH + timedelta(seconds=rng.randrange(span))
+        image = ''
+        if image_names and rng.random() < images:
+            image = rng.choice(image_names)
+        group_id = None
+        if group_ids and rng.random() < 0.7:
+            group_id = rng.choice(group_ids)
+        yield Post(author_id=rng.choice(user_ids), group_id=group_id,
+                   text=make_text(rng, 5, 80), pub_date=pub_date,
+                   updated=pub_date, image=image)
+
+
+def _comments(rng, count, user_ids, post_ids, span):
+    for _ in range(count):
+        # Квадрат смещает выбор к части постов: одни обсуждают активно,
+        # у большинства комментариев почти нет
+        post_id = post_ids[int(len(post_ids) * rng.random() ** 2)]
+        yield Comment(post_id=post_id, author_id=rng.choice(user_ids),
+                      text=make_text(rng, 2, 30),
+                      created=EPOCH + timedelta(seconds=rng.randrange(span)))
+
+
+def _follows(rng, count, user_ids):
+    for user_id in user_ids:
+        authors = rng.sample(user_ids, min(count + 1, len(user_ids)))
+        authors = [author_id for author_id in authors
+                   if author_id != user_id]
+        for author_id in authors[:count]:
+            yield Follow(user_id=user_id, author_id=author_id)
+
+
+def rebuild_derived(users, posts, comments):
+    """Достраивает для новых строк то, что обычно поддерживают сигналы.
+
+    Счётчики новых авторов, групп и профилей заведутся при первом
+    чтении, общий счётчик постов сбрасывается.
+    """
+    counters.count_comments(posts)
+    counters.drop_total_counter()
+    timeline.rebuild_timelines(users=users, posts=posts)
+    search.get_backend().index_new(posts, comments)
+    bump_feed_generation()
+    touch_feeds('all')
+
+
+def seed_database(users=100, groups=10, posts=1000, comments=3000,
+                  follows=10, images=0.0, days=365, seed=0,
+                  prefix='seed', password=None, batch_size=5000,
+                  progress=None):
+    """Создаёт пользователей, группы, посты, комментарии и подписки.
+
+    `follows` — на скольких авторов подписан каждый пользователь,
+    `images` — доля постов с картинкой. `progress(label, done)`
+    вызывается в начале этапа с нулём и после каждой пачки.
+    Возвращает id созданных объектов и время этапов.
+    """
+    rng = random.Random(seed)
+    progress = progress or (lambda label, done: None)
+    timings = {}
+    started = time.perf_counter()
+
+    def stage(label):
+        nonlocal started
+        now = time.perf_counter()
+        timings[label] = round(now - started, 3)
+        started = now
+
+    # Хеш один на всех: иначе PBKDF2 займёт больше времени, чем запись
+    password_hash = make_password(password)
+    last_user = _last_id(User)
+    _bulk(User, (User(username=f'{prefix}-user-{index}',
+                      first_name=make_text(rng, 1, 1),
+                      password=password_hash)
+                 for index in range(users)), batch_size, 'users', progress)
+    user_ids = _new_ids(User, last_user)
+    stage('users')
+
+    last_group = _last_id(Group)
+    _bulk(Group, (Group(title=make_text(rng, 1, 3),
+                        slug=f'{prefix}-group-{index}',
+                        description=make_text(rng, 5, 20))
+                  for index in range(groups)), batch_size, 'groups', progress)
+    group_ids = _new_ids(Group, last_group)
+    stage('groups')
+
+    image_names = make_images(rng, prefix) if images else []
+    span = days * 24 * 3600
+    last_post = _last_id(Post)
+    with _manual_dates(Post._meta.get_field('pub_date'),
+                       Post._meta.get_field('updated')):
+        _bulk(Post, _posts(rng, posts, user_ids, group_ids, image_names,
+                           images, span),
+              batch_size, 'posts', progress)
+    post_ids = _new_ids(Post, last_post)
+    stage('posts')
+
+    last_comment = _last_id(Comment)
+    if post_ids:
+        with _manual_dates(Comment._meta.get_field('created')):
+            _bulk(Comment, _comments(rng, comments, user_ids, post_ids, span),
+                  batch_size, 'comments', progress)
+    stage('comments')
+
+    _bulk(Follow, _follows(rng, follows, user_ids), batch_size, 'follows',
+          progress, ignore_conflicts=True)
+    stage('follows')
+
+    rebuild_derived(User.objects.filter(pk__gt=last_user).values('pk'),
+                    Post.objects.filter(pk__gt=last_post),
+                    Comment.objects.filter(pk__gt=last_comment))
+    stage('rebuild')
+    return {
+        'user_ids': user_ids,
+        'group_ids': group_ids,
+        'post_ids': post_ids,
+        'timings': timings,
+    }
@@ -0,0 +1,218 @@
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, derivatives, syndication, tasks, timeline
+from .cache import (bump_card_version, bump_feed_generation, post_feeds,
+                    touch_feeds)
+from .models import Comment, Follow, Group, ImageDerivative, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, **kwargs):
+    """Запоминает прежние группу и картинку редактируемого поста."""
+    instance._previous_group_id = instance._previous_image = None
+    if instance.pk is not None:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image').first()
+        if previous is not None:
+            (instance._previous_group_id,
+             instance._previous_image) = previous
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_counters(1, instance.author_id, instance.group_id)
+        tasks.fan_out_post.delay(instance.pk)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        if previous_group_id is not None:
+            counters.shift_counters(
+                -1, group_id=previous_group_id, total=False)
+        if instance.group_id is not None:
+            counters.shift_counters(
+                1, group_id=instance.group_id, total=False)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.shift_counters(-1, instance.author_id, instance.group_id)
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    counters.shift_follows(instance.user_id, instance.author_id, 1)
+    timeline.forget_follower_count(instance.author_id)
+    timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    counters.shift_follows(instance.user_id, instance.author_id, -1)
+    timeline.forget_follower_count(instance.author_id)
+    timeline.drop_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    """Число комментариев есть на карточках в кешированных страницах."""
+    if created and not raw:
+        counters.shift_comments(instance.post_id, 1)
+        bump_feed_generation()
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.shift_comments(instance.post_id, -1)
+    bump_feed_generation()
+
+
+@receiver(pre_delete, sender=Group)
+def forget_group_counter(sender, instance, **kwargs):
+    counters.drop_group_counter(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def touch_group_posts(sender, instance, raw=False, **kwargs):
+    """Сбрасывает кеш карточек постов группы.
+
+    При удалении группы у постов пропадает group_id, а с ним и ключ.
+    """
+    if not raw:
+        bump_card_version(f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=User)
+def touch_author_posts(sender, instance, created, update_fields=None,
+                       raw=False, **kwargs):
+    """Сбрасывает кеш карточек постов автора.
+
+    Вход пользователя сохраняет только last_login и карточки не трогает.
+    """
+    if raw or created:
+        return
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_card_version(f'author:{instance.pk}')
+    bump_feed_generation()
+    touch_feeds('all')
+    syndication.invalidate()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_feed_pages(sender, raw=False, **kwargs):
+    if not raw:
+        bump_feed_generation()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def touch_post_feeds(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    feeds = post_feeds(instance.author_id, instance.group_id)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id not in (None, instance.group_id):
+        feeds.append(f'group:{previous_group_id}')
+    touch_feeds(*feeds)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_comment_feeds(sender, instance, raw=False, **kwargs):
+    """Число комментариев видно на карточке поста во всех его лентах."""
+    if raw:
+        return
+    if Comment.post.is_cached(instance):
+        author_id, group_id = (instance.post.author_id,
+                               instance.post.group_id)
+    else:
+        post = Post.objects.filter(pk=instance.post_id).values_list(
+            'author_id', 'group_id').first()
+        if post is None:
+            return
+        author_id, group_id = post
+    touch_feeds(*post_feeds(author_id, group_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def touch_follow_feeds(sender, instance, raw=False, **kwargs):
+    """Счётчики и кнопка подписки на страницах обоих профилей."""
+    if not raw:
+        touch_feeds(f'author:{instance.user_id}',
+                    f'author:{instance.author_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def touch_group_feeds(sender, instance, raw=False, **kwargs):
+    """Название группы есть на карточках во всех лентах."""
+    if not raw:
+        touch_feeds('all')
+        syndication.invalidate()
+
+
+@receiver(post_save, sender=Post)
+def syndicate_post(sender, instance, raw=False, **kwargs):
+    """Списки лент правятся после коммита: откат не должен их менять."""
+    if not raw:
+        previous_group_id = getattr(instance, '_previous_group_id', None)
+        transaction.on_commit(
+            lambda: syndication.add_post(instance, previous_group_id))
+
+
+@receiver(post_delete, sender=Post)
+def unsyndicate_post(sender, instance, **kwargs):
+    # К коммиту delete() уже обнулит pk экземпляра
+    post_id = instance.pk
+    feeds = post_feeds(instance.author_id, instance.group_id)
+    transaction.on_commit(
+        lambda: syndication.remove_post(post_id, feeds))
+
+
+@receiver(post_save, sender=Post)
+def drop_stale_derivatives(sender, instance, created, raw=False, **kwargs):
+    """Копии прежней картинки не должны пережить её замену или удаление."""
+    if raw or created:
+        return
+    previous_image = getattr(instance, '_previous_image', None)
+    if previous_image and previous_image != instance.image.name:
+        derivatives.delete_derivatives(instance)
+
+
+@receiver(post_delete, sender=ImageDerivative)
+def delete_derivative_file(sender, instance, **kwargs):
+    derivatives.delete_derivative_file(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        tasks.index_post.delay(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    tasks.remove_post.delay(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        tasks.index_comment.delay(instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    tasks.remove_comment.delay(instance.pk)
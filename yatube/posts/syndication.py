@@ -0,0 +1,207 @@
+"""Atom- и RSS-ленты: общая, группы и автора.
+
+Последние SYNDICATION_ITEMS записей каждой ленты лежат в кеше готовыми
+словарями. Сохранение поста правит эти списки на месте, удаление
+выбрасывает пост из них, поэтому XML собирается без запросов к постам.
+Правки идут после коммита транзакции и под блокировкой ключа списка:
+её же берёт чтение, которое строит список из базы, так что правка
+не теряется между чтением и записью. Правка, не дождавшаяся
+блокировки, сбрасывает списки сменой поколения.
+Переименование группы или автора сбрасывает все списки сменой поколения.
+Условный GET берёт версии лент из `cache.feeds_modified`.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.text import Truncator
+
+from .cache import author_feeds, conditional_feed, group_feeds, post_feeds
+from .models import Group, Post, User
+
+FORMATS = {'atom': Atom1Feed, 'rss': Rss201rev2Feed}
+GENERATION_KEY = 'posts:syndication_generation'
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 1.0
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def _items_key(feed):
+    return f'posts:syndication:{_generation()}:{feed}'
+
+
+def invalidate():
+    """Сбрасывает списки всех лент."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        _generation()
+
+
+def post_item(post):
+    """Запись ленты; ссылка хранится без домена."""
+    first_line = post.text.splitlines()[0] if post.text else ''
+    return {
+        'id': post.pk,
+        'title': Truncator(first_line).chars(60),
+        'text': post.text,
+        'link': reverse('posts:post_detail', args=[post.pk]),
+        'author': post.author.get_full_name() or post.author.username,
+        'group': post.group.title if post.group_id else None,
+        'pub_date': post.pub_date,
+        'updated': post.updated,
+    }
+
+
+def feed_items(feed, posts):
+    """Записи ленты из кеша; при промахе строятся из queryset posts.
+
+    Список кладётся в кеш, только если чтение взяло блокировку: иначе
+    его может одновременно править сигнал.
+    """
+    key = _items_key(feed)
+    items = cache.get(key)
+    if items is None:
+        locked = cache.add(f'{key}:lock', 1, LOCK_TIMEOUT)
+        try:
+            items = [post_item(post) for post in posts.select_related(
+                'author', 'group')[:settings.SYNDICATION_ITEMS]]
+            if locked:
+                # add не затирает список, который уже успели поправить
+                cache.add(key, items, settings.SYNDICATION_TIMEOUT)
+        finally:
+            if locked:
+                cache.delete(f'{key}:lock')
+    return items
+
+
+def _edit_items(feed, edit):
+    """Правит закешированный список ленты под блокировкой.
+
+    `edit(items)` возвращает новый список или None, чтобы удалить его.
+    Если блокировку не удалось взять за LOCK_WAIT секунд, сбрасываются
+    все списки сменой поколения. Удалять ключ нельзя: блокировку может
+    держать чтение, которое строит список по снимку до этого поста и
+    положит его уже после удаления.
+    """
+    key = _items_key(feed)
+    lock_key = f'{key}:lock'
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            invalidate()
+            return
+        time.sleep(0.05)
+    try:
+        items = cache.get(key)
+        if items is None:
+            return
+        items = edit(items)
+        if items is None:
+            cache.delete(key)
+        else:
+            cache.set(key, items, settings.SYNDICATION_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+
+
+def add_post(post, previous_group_id=None):
+    """Вставляет или обновляет пост в закешированных списках его лент."""
+    item = None
+
+    def insert(items):
+        nonlocal item
+        # Автор и группа подгружаются, только если список есть в кеше
+        item = item or post_item(post)
+        items = [entry for entry in items if entry['id'] != post.pk]
+        items.append(item)
+        items.sort(key=lambda entry: (entry['pub_date'], entry['id']),
+                   reverse=True)
+        return items[:settings.SYNDICATION_ITEMS]
+
+    for feed in post_feeds(post.author_id, post.group_id):
+        _edit_items(feed, insert)
+    if previous_group_id not in (None, post.group_id):
+        remove_post(post.pk, [f'group:{previous_group_id}'])
+
+
+def remove_post(post_id, feeds):
+    """Убирает пост из закешированных списков лент.
+
+    Полный список удаляется целиком: его хвост надо добрать из базы,
+    и это сделает следующее чтение.
+    """
+    def drop(items):
+        if all(entry['id'] != post_id for entry in items):
+            return items
+        if len(items) >= settings.SYNDICATION_ITEMS:
+            return None
+        return [entry for entry in items if entry['id'] != post_id]
+
+    for feed in feeds:
+        _edit_items(feed, drop)
+
+
+def render(request, format, title, link, description, items):
+    if format not in FORMATS:
+        raise Http404(f'Неизвестный формат ленты: {format}')
+    syndication = FORMATS[format](
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=description,
+        language='ru',
+        feed_url=request.build_absolute_uri(),
+    )
+    for item in items:
+        link = request.build_absolute_uri(item['link'])
+        syndication.add_item(
+            title=item['title'],
+            link=link,
+            description=item['text'],
+            author_name=item['author'],
+            pubdate=item['pub_date'],
+            updateddate=item['updated'],
+            unique_id=link,
+            categories=[item['group']] if item['group'] else None,
+        )
+    response = HttpResponse(content_type=syndication.content_type)
+    syndication.write(response, 'utf-8')
+    return response
+
+
+@conditional_feed(lambda request, format: ['index'])
+def index(request, format):
+    return render(request, format, 'Yatube', reverse('posts:index'),
+                  'Последние записи на Yatube',
+                  feed_items('index', Post.objects.all()))
+
+
+@conditional_feed(lambda request, slug, format: group_feeds(request, slug))
+def group_posts(request, slug, format):
+    group = get_object_or_404(Group, slug=slug)
+    return render(request, format, f'Yatube: {group.title}',
+                  reverse('posts:group_list', args=[slug]),
+                  group.description,
+                  feed_items(f'group:{group.pk}', group.posts.all()))
+
+
+@conditional_feed(
+    lambda request, username, format: author_feeds(request, username))
+def profile(request, username, format):
+    author = get_object_or_404(User, username=username)
+    name = author.get_full_name() or author.username
+    return render(request, format, f'Yatube: {name}',
+                  reverse('posts:profile', args=[username]),
+                  f'Записи пользователя {name}',
+                  feed_items(f'author:{author.pk}', author.posts.all()))
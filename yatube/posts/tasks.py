@@ -0,0 +1,45 @@
+"""Задачи фоновой очереди приложения posts.
+
+Задачи получают только id и сами читают свежую строку: к моменту
+выполнения пост могли изменить или удалить.
+"""
+from core.tasks import task
+
+from . import digests, search, timeline
+from .models import Comment, Post
+
+
+@task
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        timeline.fan_out(post)
+
+
+@task
+def index_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        search.get_backend().index_post(post)
+
+
+@task
+def remove_post(post_id):
+    search.get_backend().remove_post(post_id)
+
+
+@task
+def index_comment(comment_id):
+    comment = Comment.objects.filter(pk=comment_id).first()
+    if comment is not None:
+        search.get_backend().index_comment(comment)
+
+
+@task
+def remove_comment(comment_id):
+    search.get_backend().remove_comment(comment_id)
+
+
+@task(max_attempts=1)
+def send_digests():
+    digests.send_digests()
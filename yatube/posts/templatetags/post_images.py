@@ -0,0 +1,28 @@
+from django import template
+
+from posts.derivatives import picture_sources
+from posts.thumbnails import card_size, ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовая миниатюра карточки или None, пока нарезка не закончилась.
+
+    Если страница подготовлена attach_images, миниатюры всех её постов
+    читаются одним обращением к хранилищу.
+    """
+    if hasattr(post, 'page_images'):
+        post.page_images.load()
+        return post.thumbnail
+    geometry, options = card_size()
+    return ready_thumbnail(post.image, geometry, **options)
+
+
+@register.simple_tag
+def post_sources(post):
+    """Источники адаптивных копий картинки для <picture>."""
+    if hasattr(post, 'page_images'):
+        post.page_images.load()
+    return picture_sources(post)
@@ -0,0 +1,89 @@
+"""Бюджеты SQL-запросов на страницы приложения posts.
+
+Для каждого имени URL из posts/urls.py задано максимальное число
+запросов при рендере с холодным кешем и незаведёнными счётчиками.
+Бюджет не должен зависеть от числа постов и комментариев: рост
+запросов с данными — это N+1. В бюджет входят сессия, пользователь,
+первое создание счётчиков и задачи очереди, которые в тестах
+выполняются сразу (TASKS_EAGER).
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+QUERY_BUDGETS = {
+    # Сессия, пользователь, счётчик 'all' (SELECT, статистика
+    # планировщика, INSERT OR IGNORE, UPDATE с COUNT и SELECT при
+    # первом создании), страница, производные картинок и kvstore.
+    'index': 10,
+    # id группы для ключа кеша, сессия, пользователь, группа, счётчик
+    # группы (4 запроса при первом создании) и страница; у постов
+    # группы нет картинок.
+    'group_list': 9,
+    # id автора для ключа кеша, сессия, пользователь, автор, счётчик
+    # автора (4 запроса при первом создании), страница, проверка
+    # подписки, профиль (3 запроса при первом создании), производные
+    # и kvstore.
+    'profile': 15,
+    # Пост с автором и группой, счётчик автора (4 запроса при первом
+    # создании), сессия, пользователь, страница комментариев.
+    'post_detail': 8,
+    # Сессия, пользователь, группы для формы.
+    'post_create': 3,
+    # Сессия, пользователь, пост, автор, группы для формы.
+    'post_edit': 5,
+    # Сессия, пользователь, пост, INSERT комментария, один UPDATE
+    # счётчика комментариев и переиндексация поиска (SELECT, DELETE,
+    # INSERT), которая в тестах выполняется сразу.
+    'add_comment': 8,
+    # Сессия, пользователь, COUNT ленты с LIMIT TIMELINE_LENGTH,
+    # страница, производные, kvstore.
+    'follow_index': 6,
+    # Поиск по индексу, посты, сессия, пользователь, производные
+    # и kvstore.
+    'search': 6,
+    # Сессия, пользователь, автор, get_or_create подписки (SELECT,
+    # SAVEPOINT, INSERT, RELEASE), один UPDATE обоих профилей,
+    # копирование постов в ленту (SELECT и INSERT) и обрезка ленты.
+    'profile_follow': 11,
+    # Сессия, пользователь, автор, поиск и DELETE подписки, один UPDATE
+    # обоих профилей и удаление постов автора из ленты.
+    'profile_unfollow': 7,
+    # Метаданные страницы (id и даты) для ETag и посты страницы;
+    # сессия не читается, общего числа постов в ответе нет.
+    'api_index': 2,
+    # Группа, метаданные страницы, посты страницы и счётчик группы
+    # (4 запроса при первом создании).
+    'api_group': 7,
+    # Автор с профилем через select_related, метаданные страницы,
+    # посты страницы, профиль (3 запроса при первом создании) и
+    # счётчик автора (4 запроса при первом создании).
+    'api_profile': 10,
+    # Пост с автором и группой, страница комментариев с авторами.
+    'api_post': 2,
+    # Сессия, пользователь, метаданные ленты, посты.
+    'api_follow': 4,
+    # Последние посты с авторами и группами одним запросом.
+    'feed_index': 1,
+    # id группы для версии ленты, группа, посты.
+    'feed_group': 3,
+    # id автора для версии ленты, автор, посты.
+    'feed_profile': 3,
+}
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета запросов для TestCase."""
+
+    def assertQueryBudget(self, name, request):
+        """Выполняет request() и сверяет число запросов с бюджетом name."""
+        budget = QUERY_BUDGETS[name]
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        if len(queries) > budget:
+            sql = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(queries.captured_queries, 1)
+            )
+            self.fail(f'{name}: {len(queries)} запросов при бюджете '
+                      f'{budget}:\n{sql}')
+        return response
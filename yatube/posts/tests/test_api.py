@@ -0,0 +1,110 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(POST_PER_PAGE=3)
+class PostsApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Geralt')
+        cls.reader = User.objects.create_user(username='Jaskier')
+        cls.group = Group.objects.create(title='Ведьмаки', slug='witchers')
+        cls.posts = [Post.objects.create(author=cls.author, group=cls.group,
+                                         text=f'Пост {index}')
+                     for index in range(5)]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pagination(self):
+        """Курсор ведёт на следующую страницу без повторов."""
+        response = self.client.get(reverse('posts:api_index'))
+        data = response.json()
+        self.assertEqual([post['id'] for post in data['results']],
+                         [post.pk for post in self.posts[:-4:-1]])
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([post['id'] for post in data['results']],
+                         [post.pk for post in self.posts[1::-1]])
+        self.assertIsNone(data['next'])
+
+    def test_fields(self):
+        """?fields= оставляет только запрошенные поля."""
+        url = reverse('posts:api_group', args=[self.group.slug])
+        data = self.client.get(url, {'fields': 'id,author'}).json()
+        self.assertEqual(data['group']['posts_count'], 5)
+        self.assertEqual(data['results'][0],
+                         {'id': self.posts[-1].pk, 'author': 'Geralt'})
+        response = self.client.get(url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_not_modified(self):
+        """Неизменная лента отдаёт 304, новый комментарий меняет ETag."""
+        url = reverse('posts:api_profile', args=[self.author.username])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        Comment.objects.create(post=self.posts[-1], author=self.reader,
+                               text='Хм')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['comments_count'], 1)
+
+    def test_feed_etag_follows_deletes_and_renames(self):
+        """Удаление поста и переименование автора меняют ETag ленты."""
+        url = reverse('posts:api_group', args=[self.group.slug])
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        Post.objects.create(author=self.author, text='Вне группы').delete()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            HTTPStatus.NOT_MODIFIED)
+        Post.objects.filter(pk=self.posts[0].pk).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['group']['posts_count'], 4)
+        etag = response['ETag']
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'Gwynbleidd'
+        author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['author'],
+                         'Gwynbleidd')
+
+    def test_post_detail(self):
+        """Пост отдаётся с комментариями и условным GET."""
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text='Хм')
+        url = reverse('posts:api_post', args=[post.pk])
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data['text'], post.text)
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         ['Хм'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_follow_feed(self):
+        """Лента подписок только для авторизованных и зависит от cookie."""
+        url = reverse('posts:api_follow')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertIn('Cookie', response['Vary'])
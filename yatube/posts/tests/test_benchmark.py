@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+
+from posts.benchmark import SCENARIOS, compare, run_benchmark, seed
+from posts.models import Comment, Post
+
+from .media import TempMediaMixin
+
+
+class BenchmarkTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_is_deterministic(self):
+        """Набор данных задаётся размерами и зерном."""
+        dataset = seed(users=3, groups=2, posts=10, comments=5, follows=2,
+                       images=0.5, seed=7)
+        self.assertEqual(Post.objects.count(), 10)
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertEqual(len(dataset['post_ids']), 10)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+
+    def test_client_run_reports_every_scenario(self):
+        """Прогон через клиент даёт перцентили и число запросов."""
+        dataset = seed(users=3, groups=2, posts=10, comments=5, follows=2,
+                       images=0, seed=7)
+        results = run_benchmark(dataset, modes=('client',), count=3)
+        self.assertEqual(set(results['client']), set(SCENARIOS))
+        for name, summary in results['client'].items():
+            with self.subTest(name=name):
+                self.assertEqual(summary['errors'], 0)
+                self.assertEqual(summary['requests'], 3)
+                self.assertIn('p95', summary['latency_ms'])
+                self.assertIn('mean', summary['queries'])
+        slower = {'client': {'index': {'latency_ms': {'p95': 15.0}}}}
+        baseline = {'client': {'index': {'latency_ms': {'p95': 10.0}}}}
+        self.assertEqual(compare(baseline, slower), {'client/index': 50.0})
+
+
+class WSGIBenchmarkTests(TempMediaMixin, TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_wsgi_run_reports_every_scenario(self):
+        """Прогон через WSGI-сервер проходит без ошибок, вход и CSRF."""
+        dataset = seed(users=3, groups=2, posts=10, comments=5, follows=2,
+                       images=0, seed=7)
+        results = run_benchmark(dataset, modes=('wsgi',), count=2,
+                                concurrency=1)
+        self.assertEqual(set(results['wsgi']), set(SCENARIOS))
+        for name, summary in results['wsgi'].items():
+            with self.subTest(name=name):
+                self.assertEqual(summary['errors'], 0)
+                self.assertEqual(summary['requests'], 2)
+                self.assertNotIn('queries', summary)
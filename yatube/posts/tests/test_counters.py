@@ -0,0 +1,146 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.counters import post_count, user_profile
+from posts.models import Comment, Follow, Group, Post, PostCounter
+from users.models import Profile
+
+User = get_user_model()
+
+
+class PostCounterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Yennefer')
+        cls.group = Group.objects.create(title='Ложа', slug='lodge')
+        cls.other_group = Group.objects.create(title='Братство',
+                                               slug='brotherhood')
+        Post.objects.create(author=cls.user, text='Первый',
+                            group=cls.group)
+
+    def test_counters_follow_posts(self):
+        """Счётчики сдвигаются при создании, правке и удалении постов."""
+        self.assertEqual(post_count(), 1)
+        self.assertEqual(post_count(author=self.user), 1)
+        self.assertEqual(post_count(group=self.group), 1)
+        post = Post.objects.create(author=self.user, text='Второй',
+                                   group=self.group)
+        self.assertEqual(post_count(), 2)
+        self.assertEqual(post_count(group=self.group), 2)
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(post_count(group=self.group), 1)
+        self.assertEqual(post_count(group=self.other_group), 1)
+        self.assertEqual(post_count(), 2)
+        post.delete()
+        self.assertEqual(post_count(), 1)
+        self.assertEqual(post_count(author=self.user), 1)
+        self.assertEqual(post_count(group=self.other_group), 0)
+
+    def test_missing_counter_is_created_before_count(self):
+        """Счётчик заводится до подсчёта и считается одним UPDATE."""
+        key = f'group:{self.group.pk}'
+        PostCounter.objects.filter(key=key).delete()
+        self.assertEqual(post_count(group=self.group), 1)
+        self.assertEqual(PostCounter.objects.get(key=key).value, 1)
+
+    def test_group_delete_drops_counter(self):
+        """Удаление группы убирает её счётчик."""
+        group = Group.objects.create(title='Круг', slug='circle')
+        Post.objects.create(author=self.user, text='В круге', group=group)
+        self.assertEqual(post_count(group=group), 1)
+        key = f'group:{group.pk}'
+        group.delete()
+        self.assertFalse(PostCounter.objects.filter(key=key).exists())
+        self.assertEqual(post_count(author=self.user), 2)
+
+    def test_stored_counter_skips_count_query(self):
+        """Заведённый счётчик читается одним запросом без COUNT(*)."""
+        post_count(author=self.user)
+        self.assertTrue(
+            PostCounter.objects.filter(key=f'author:{self.user.pk}').exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(post_count(author=self.user), 1)
+
+
+class CommentFollowCounterTest(TestCase):
+    def setUp(self):
+        # Профиль кешируется на объекте пользователя, поэтому объекты
+        # создаются заново для каждого теста
+        self.user = User.objects.create_user(username='Triss')
+        self.author = User.objects.create_user(username='Philippa')
+        self.bystander = User.objects.create_user(username='Sabrina')
+        self.post = Post.objects.create(author=self.author, text='Чародейки')
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_comments_count(self):
+        """Комментарий через вьюху сдвигает счётчик поста."""
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Согласна'}
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.filter(post=post).delete()
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 0)
+
+    def test_follow_counts(self):
+        """Подписка и отписка сдвигают счётчики обеих сторон."""
+        Follow.objects.create(user=self.bystander, author=self.author)
+        self.assertEqual(user_profile(self.author).followers_count, 1)
+        self.assertEqual(user_profile(self.user).following_count, 0)
+        follow_url = reverse('posts:profile_follow',
+                             kwargs={'username': self.author.username})
+        self.client.get(follow_url)
+        self.client.get(follow_url)
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 2)
+        self.assertEqual(
+            Profile.objects.get(user=self.user).following_count, 1)
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 1)
+        self.assertTrue(Follow.objects.filter(
+            user=self.bystander, author=self.author).exists())
+
+    def test_drifted_counters_stay_non_negative(self):
+        """Разошедшийся счётчик не уходит ниже нуля при отписке."""
+        user_profile(self.user)
+        user_profile(self.author)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        Profile.objects.update(followers_count=0, following_count=0)
+        Post.objects.update(comments_count=0)
+        comment = Comment.objects.create(post=self.post, author=self.user,
+                                         text='Да')
+        Post.objects.update(comments_count=0)
+        follow.delete()
+        comment.delete()
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 0)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 0)
+
+    def test_reconcile_counters(self):
+        """Команда исправляет счётчики, сбитые записью в обход ORM."""
+        user_profile(self.user)
+        user_profile(self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        Comment.objects.create(post=self.post, author=self.user, text='Да')
+        Post.objects.update(comments_count=7)
+        Profile.objects.update(followers_count=5, following_count=5)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.user).following_count, 1)
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts import digests
+from posts.models import DigestRun, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    DIGEST_SITE_URL='http://yatube.test')
+class DigestTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Regis')
+        cls.reader = User.objects.create_user(
+            username='Dettlaff', email='dettlaff@example.com')
+        cls.other = User.objects.create_user(
+            username='Orianna', email='orianna@example.com')
+        cls.silent = User.objects.create_user(username='Syanna')
+        cls.group = Group.objects.create(title='Вампиры', slug='vampires')
+
+    def setUp(self):
+        cache.clear()
+        for user in (self.reader, self.other, self.silent):
+            Follow.objects.create(user=user, author=self.author)
+
+    def send(self):
+        return digests.send_digests(now=timezone.now() + timedelta(minutes=5))
+
+    def test_one_message_per_recipient(self):
+        """Каждый подписчик с почтой получает одно письмо со всеми постами."""
+        first = Post.objects.create(author=self.author, text='Первый пост')
+        second = Post.objects.create(author=self.author, group=self.group,
+                                     text='Второй пост')
+        run = self.send()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['dettlaff@example.com', 'orianna@example.com'])
+        message = mail.outbox[0]
+        self.assertIn('2', message.subject)
+        self.assertLess(message.body.index(second.text),
+                        message.body.index(first.text))
+        self.assertIn(f'http://yatube.test/posts/{first.pk}/', message.body)
+        html, mimetype = message.alternatives[0]
+        self.assertEqual(mimetype, 'text/html')
+        self.assertIn(self.group.title, html)
+        self.assertEqual((run.recipients, run.posts, run.sent), (2, 2, 2))
+        self.assertIsNotNone(run.finished)
+
+    def test_next_run_skips_sent_posts(self):
+        """Следующий запуск начинает окно с конца прошлого."""
+        Post.objects.create(author=self.author, text='Старый пост')
+        first = self.send()
+        mail.outbox = []
+        second = self.send()
+        self.assertEqual(second.since, first.until)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(DigestRun.objects.count(), 2)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_posts_not_yet_fanned_out(self):
+        """Пост попадает в письмо, даже если очередь не разложила его."""
+        Post.objects.create(author=self.author, text='Ещё в очереди')
+        run = self.send()
+        self.assertEqual(run.sent, 2)
+        self.assertIn('Ещё в очереди', mail.outbox[0].body)
+
+    def test_one_run_at_a_time(self):
+        """Пока идёт запуск, второй не начинается; зависший не мешает."""
+        Post.objects.create(author=self.author, text='Пост')
+        running = DigestRun.objects.create(since=timezone.now(),
+                                           until=timezone.now())
+        self.assertIsNone(self.send())
+        self.assertEqual(mail.outbox, [])
+        DigestRun.objects.filter(pk=running.pk).update(
+            started=timezone.now() - timedelta(days=1))
+        self.assertEqual(self.send().sent, 2)
+
+    @override_settings(DIGEST_MAX_POSTS=1)
+    def test_long_digest_is_truncated(self):
+        """В письмо попадают DIGEST_MAX_POSTS постов и счётчик остальных."""
+        Post.objects.create(author=self.author, text='Ранний пост')
+        Post.objects.create(author=self.author, text='Поздний пост')
+        self.send()
+        body = mail.outbox[0].body
+        self.assertIn('Поздний пост', body)
+        self.assertNotIn('Ранний пост', body)
+        self.assertIn('И ещё постов: 1', body)
+
+    @override_settings(DIGEST_BATCH_SIZE=1)
+    def test_cards_rendered_once_over_one_connection(self):
+        """Карточки рендерятся раз на пост, письма идут одним соединением."""
+        Post.objects.create(author=self.author, text='Общий пост')
+        with mock.patch('posts.digests.get_connection',
+                        wraps=get_connection) as connect, \
+                mock.patch('posts.digests.render_posts',
+                           wraps=digests.render_posts) as render:
+            run = self.send()
+        connect.assert_called_once_with()
+        render.assert_called_once()
+        self.assertEqual(len(render.call_args[0][0]), 1)
+        self.assertEqual(run.sent, 2)
@@ -1,25 +1,23 @@
-import tempfile
-import shutil
+from http import HTTPStatus
+from io import BytesIO
 
-from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from faker import Faker
+from PIL import Image
 from django.core.cache import cache
 
 from posts.models import Group, Post, Comment
 from ..forms import PostForm
+from .media import SMALL_GIF, TempMediaMixin
 
 User = get_user_model()
 fake = Faker()
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
-
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PostCreateFromTests(TestCase):
+class PostCreateFromTests(TempMediaMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -36,11 +34,6 @@ class PostCreateFromTests(TestCase):
         )
         cls.form = PostForm()
 
-    @classmethod
-    def tearDownClass(cls):
-        super().tearDownClass()
-        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
-
     def setUp(self):
         self.authorized_client = Client()
         self.guest_client = Client()
@@ -49,17 +42,9 @@ class PostCreateFromTests(TestCase):
     def test_post(self):
         """Тест создания поста"""
         post_count = Post.objects.count()
-        small_gif = (
-            b'\x47\x49\x46\x38\x39\x61\x02\x00'
-            b'\x01\x00\x80\x00\x00\x00\x00\x00'
-            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
-            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
-            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
-            b'\x0A\x00\x3B'
-        )
         uploaded = SimpleUploadedFile(
             name='small.gif',
-            content=small_gif,
+            content=SMALL_GIF,
             content_type='image/gif'
         )
         form_data = {
@@ -156,3 +141,61 @@ class CommentsTests(TestCase):
             kwargs={'post_id': self.post.id}))
         self.assertEqual(form_data['text'], comment.text)
         self.assertEqual(self.user, comment.author)
+
+
+class ImageUploadTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Vesemir')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    @staticmethod
+    def get_image(size=(300, 200), exif=None, name='photo.jpg'):
+        buffer = BytesIO()
+        options = {'exif': exif} if exif else {}
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG', **options)
+        return SimpleUploadedFile(name, buffer.getvalue(),
+                                  content_type='image/jpeg')
+
+    def post_image(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': image}
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=300 * 199)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с лишними пикселями отклоняется по заголовку."""
+        response = self.post_image(self.get_image())
+        self.assertFormError(response, 'form', 'image',
+                             'Слишком большое разрешение картинки')
+        self.assertFalse(Post.objects.filter(text='Фото').exists())
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_too_large_file_rejected(self):
+        """Слишком тяжёлый файл отклоняется."""
+        response = self.post_image(self.get_image())
+        self.assertFalse(response.context['form'].is_valid())
+        self.assertIn('image', response.context['form'].errors)
+
+    @override_settings(FILE_UPLOAD_MAX_REQUEST_SIZE=100)
+    def test_oversized_request_refused(self):
+        """Запрос больше предела отклоняется до чтения тела."""
+        response = self.post_image(self.get_image())
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    @override_settings(THUMBNAIL_ASYNC=False, POST_IMAGE_MAX_SIDE=150)
+    def test_original_downscaled_and_stripped(self):
+        """Оригинал уменьшается, а EXIF вырезается."""
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera'
+        self.post_image(self.get_image(exif=exif.tobytes()))
+        post = Post.objects.get(text='Фото')
+        with post.image.open('rb') as file:
+            stored = Image.open(file)
+            self.assertEqual(stored.size, (150, 100))
+            self.assertNotIn('exif', stored.info)
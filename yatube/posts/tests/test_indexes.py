@@ -0,0 +1,17 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class FeedIndexTests(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент и комментариев идут по составным индексам."""
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        plans = out.getvalue()
+        for index in ('post_date_idx', 'post_author_date_idx',
+                      'post_group_date_idx', 'comment_post_created_idx'):
+            with self.subTest(index=index):
+                self.assertIn(f'USING INDEX {index}', plans)
+        self.assertIn('post_date_idx (pub_date<?)', plans)
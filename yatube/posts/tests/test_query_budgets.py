@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from users.models import Profile
+
+from posts.counters import reset_counters
+from posts.models import Comment, Follow, Group, Post
+from posts.urls import urlpatterns
+
+from .budgets import QUERY_BUDGETS, QueryBudgetMixin
+from .media import SMALL_GIF, TempMediaMixin
+
+User = get_user_model()
+
+
+class QueryBudgetTests(TempMediaMixin, QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='Jaskier')
+        cls.authors = [User.objects.create_user(username=f'Witcher{index}')
+                       for index in range(3)]
+        cls.groups = [Group.objects.create(title=f'Школа {index}',
+                                           slug=f'school-{index}')
+                      for index in range(2)]
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.reader, author=author)
+        for index in range(15):
+            image = SimpleUploadedFile(f'budget{index}.gif', SMALL_GIF,
+                                       content_type='image/gif')
+            Post.objects.create(
+                author=cls.authors[index % 3],
+                group=cls.groups[index % 2] if index % 3 else None,
+                text=f'Пост {index}',
+                image=image if index % 2 else None,
+            )
+        cls.post = Post.objects.filter(author=cls.authors[0]).first()
+        for index in range(10):
+            Comment.objects.create(post=cls.post,
+                                   author=cls.authors[index % 3],
+                                   text=f'Комментарий {index}')
+
+    def setUp(self):
+        self.cold_start()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.authors[0])
+
+    @staticmethod
+    def cold_start():
+        """Пустой кеш и ни одного заведённого счётчика постов и подписок.
+
+        Вызывается перед каждой страницей, чтобы её бюджет не зависел от
+        того, какие страницы уже прогрели кеш и счётчики.
+        """
+        cache.clear()
+        reset_counters()
+        Profile.objects.all().delete()
+
+    def test_every_view_has_budget(self):
+        """У каждого URL приложения posts есть бюджет запросов."""
+        self.assertEqual(
+            {pattern.name for pattern in urlpatterns}, set(QUERY_BUDGETS))
+
+    def test_pages_within_budget(self):
+        """Страницы рендерятся не больше чем за бюджет запросов."""
+        post_id = {'post_id': self.post.pk}
+        # Подписка и отписка не зависят друг от друга: читатель
+        # подписан на первых двух авторов
+        followed = {'username': self.authors[1].username}
+        author = {'username': self.authors[2].username}
+        pages = {
+            'index': (self.reader_client, {}),
+            'group_list': (self.reader_client,
+                           {'slug': self.groups[0].slug}),
+            'profile': (self.reader_client,
+                        {'username': self.authors[0].username}),
+            'post_detail': (self.reader_client, post_id),
+            'post_create': (self.author_client, {}),
+            'post_edit': (self.author_client, post_id),
+            'follow_index': (self.reader_client, {}),
+            'search': (self.reader_client, {}),
+            'profile_follow': (self.reader_client, author),
+            'profile_unfollow': (self.reader_client, followed),
+            'api_index': (self.reader_client, {}),
+            'api_group': (self.reader_client,
+                          {'slug': self.groups[0].slug}),
+            'api_profile': (self.reader_client,
+                            {'username': self.authors[0].username}),
+            'api_post': (self.reader_client, post_id),
+            'api_follow': (self.reader_client, {}),
+            'feed_index': (self.client, {'format': 'atom'}),
+            'feed_group': (self.client, {'slug': self.groups[0].slug,
+                                         'format': 'rss'}),
+            'feed_profile': (self.client,
+                             {'username': self.authors[0].username,
+                              'format': 'atom'}),
+        }
+        for name, (client, kwargs) in pages.items():
+            with self.subTest(name=name):
+                self.cold_start()
+                url = reverse(f'posts:{name}', kwargs=kwargs)
+                if name == 'search':
+                    url += '?q=Пост'
+                self.assertQueryBudget(name, lambda: client.get(url))
+
+    def test_add_comment_within_budget(self):
+        """Добавление комментария укладывается в бюджет."""
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.pk})
+        self.assertQueryBudget(
+            'add_comment',
+            lambda: self.reader_client.post(url, {'text': 'Хм'}))
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.search import SimpleSearchBackend, get_backend, search_post_ids
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Ciri')
+        cls.sword = Post.objects.create(author=cls.user,
+                                        text='Серебряный меч для чудовищ')
+        cls.horse = Post.objects.create(author=cls.user,
+                                        text='Лошадь по имени Плотва')
+        cls.comment = Comment.objects.create(
+            post=cls.horse, author=cls.user, text='Плотва снова на крыше')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_indexed_on_save(self):
+        """Новый и изменённый пост сразу находится поиском."""
+        self.assertEqual(search_post_ids('серебряный'), [self.sword.pk])
+        post = Post.objects.get(pk=self.sword.pk)
+        post.text = 'Стальной меч для людей'
+        post.save()
+        self.assertEqual(search_post_ids('серебряный'), [])
+        self.assertEqual(search_post_ids('стальной меч'), [self.sword.pk])
+
+    def test_comment_finds_post(self):
+        """Пост находится по тексту комментария, пока тот не удалён."""
+        self.assertEqual(search_post_ids('крыше'), [self.horse.pk])
+        Comment.objects.get(pk=self.comment.pk).delete()
+        self.assertEqual(search_post_ids('крыше'), [])
+
+    def test_deleted_post_removed(self):
+        """Удалённый пост пропадает из индекса вместе с комментариями."""
+        Post.objects.get(pk=self.horse.pk).delete()
+        self.assertEqual(search_post_ids('плотва'), [])
+
+    def test_ranking_and_prefix(self):
+        """Совпадение в посте выше совпадения в комментарии."""
+        Comment.objects.create(post=self.sword, author=self.user,
+                               text='Плотва бы не донесла')
+        self.assertEqual(search_post_ids('плотв'),
+                         [self.horse.pk, self.sword.pk])
+
+    def test_fts_syntax_is_escaped(self):
+        """Кавычки и операторы FTS5 во вводе не ломают запрос."""
+        self.assertEqual(search_post_ids('"меч*'), [self.sword.pk])
+        self.assertEqual(search_post_ids('NEAR( OR "'), [])
+
+    @override_settings(
+        POST_SEARCH_BACKEND='posts.search.SimpleSearchBackend')
+    def test_simple_backend(self):
+        """Запасной бэкенд ищет по постам и комментариям."""
+        self.assertIsInstance(get_backend(), SimpleSearchBackend)
+        self.assertEqual(search_post_ids('крыше'), [self.horse.pk])
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты с пагинацией."""
+        response = self.client.get(reverse('posts:search'), {'q': 'меч'})
+        self.assertEqual(list(response.context['page_obj']), [self.sword])
+        self.assertContains(response, 'Серебряный меч')
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт через индекс."""
+        admin = User.objects.create_superuser('Yen', 'yen@example.com', 'x')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'плотва'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.horse])
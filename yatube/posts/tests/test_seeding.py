@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.counters import post_count
+from posts.models import Comment, Follow, Post, TimelineEntry
+from posts.search import search_post_ids
+from posts.seeding import seed_database
+
+User = get_user_model()
+
+
+class SeedingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_same_seed_same_data(self):
+        """Одно зерно даёт одинаковые тексты и даты."""
+        first = seed_database(users=5, groups=2, posts=20, comments=30,
+                              follows=2, seed=3, prefix='a')
+        second = seed_database(users=5, groups=2, posts=20, comments=30,
+                               follows=2, seed=3, prefix='b')
+        posts = Post.objects.order_by('pk')
+        self.assertEqual(
+            list(posts.filter(pk__in=first['post_ids'])
+                 .values_list('text', 'pub_date')),
+            list(posts.filter(pk__in=second['post_ids'])
+                 .values_list('text', 'pub_date')),
+        )
+
+    @override_settings(TIMELINE_LENGTH=5)
+    def test_derived_data_rebuilt(self):
+        """Счётчики, ленты и индекс согласованы с записанными данными."""
+        result = seed_database(users=6, groups=2, posts=40, comments=50,
+                               follows=3, batch_size=7)
+        self.assertEqual(post_count(), 40)
+        self.assertEqual(Follow.objects.count(), 18)
+        self.assertFalse(Post.objects.filter(fanned_out=False).exists())
+        for post in Post.objects.all():
+            self.assertEqual(post.comments_count,
+                             Comment.objects.filter(post=post).count())
+        reader = result['user_ids'][0]
+        entries = TimelineEntry.objects.filter(user_id=reader)
+        self.assertEqual(entries.count(), 5)
+        expected = Post.objects.filter(
+            author__following__user_id=reader)[:5]
+        self.assertEqual(set(entries.values_list('post_id', flat=True)),
+                         {post.pk for post in expected})
+        post = Post.objects.first()
+        word = post.text.split()[0]
+        self.assertIn(post.pk, search_post_ids(word))
+
+    def test_existing_data_untouched(self):
+        """Заполнение не перестраивает ленты и счётчики прежних строк."""
+        author = User.objects.create_user(username='Eskel')
+        reader = User.objects.create_user(username='Vesemir')
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(author=author, text='Старый пост')
+        entries = list(TimelineEntry.objects.values_list('pk', flat=True))
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+        seed_database(users=4, posts=10, comments=10, follows=2)
+        self.assertEqual(list(TimelineEntry.objects.filter(
+            user=reader).values_list('pk', flat=True)), entries)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 7)
+        self.assertEqual(post_count(), 11)
+        self.assertIn(post.pk, search_post_ids('Старый'))
+
+    def test_command_reports_progress(self):
+        """Команда печатает ход записи и время этапов."""
+        out = StringIO()
+        call_command('seed_yatube', users=3, posts=10, comments=5,
+                     follows=1, batch_size=4, stdout=out)
+        self.assertIn('posts: 8', out.getvalue())
+        self.assertIn('Готово', out.getvalue())
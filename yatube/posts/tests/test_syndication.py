@@ -0,0 +1,118 @@
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import syndication
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class SyndicationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Regis')
+        cls.group = Group.objects.create(title='Вампиры', slug='vampires')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Мандрагоровый самогон')
+
+    def setUp(self):
+        cache.clear()
+        # TestCase не коммитит транзакцию, правки выполняются сразу
+        self.on_commit = mock.patch(
+            'posts.signals.transaction.on_commit',
+            lambda callback: callback())
+
+    def test_formats(self):
+        """Лента отдаётся в Atom и RSS, неизвестный формат — 404."""
+        response = self.client.get(reverse('posts:feed_index',
+                                           args=['atom']))
+        self.assertTrue(response['Content-Type'].startswith(
+            'application/atom+xml'))
+        self.assertContains(response, 'Мандрагоровый самогон')
+        response = self.client.get(reverse(
+            'posts:feed_group', args=['vampires', 'rss']))
+        self.assertContains(response, '<category>Вампиры</category>')
+        response = self.client.get(reverse('posts:feed_index',
+                                           args=['json']))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_items_updated_in_cache(self):
+        """Новый пост попадает в ленту без перестроения списка."""
+        url = reverse('posts:feed_profile', args=['Regis', 'atom'])
+        self.client.get(url)
+        with self.on_commit:
+            Post.objects.create(author=self.author, text='Свежая запись')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'Свежая запись')
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'posts_post' in query['sql']])
+        with self.on_commit:
+            Post.objects.filter(text='Свежая запись').get().delete()
+        self.assertNotContains(self.client.get(url), 'Свежая запись')
+
+    def test_items_wait_for_commit(self):
+        """Список не правится, пока транзакция поста не закоммичена."""
+        url = reverse('posts:feed_profile', args=['Regis', 'atom'])
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='Незакоммиченная')
+        key = syndication._items_key(f'author:{self.author.pk}')
+        self.assertEqual([item['text'] for item in cache.get(key)],
+                         [self.post.text])
+
+    def test_locked_items_dropped(self):
+        """Если список правит другой процесс, списки сбрасываются."""
+        url = reverse('posts:feed_profile', args=['Regis', 'atom'])
+        self.client.get(url)
+        feed = f'author:{self.author.pk}'
+        key = syndication._items_key(feed)
+        cache.add(f'{key}:lock', 1)
+        with self.on_commit, \
+                mock.patch('posts.syndication.LOCK_WAIT', 0):
+            Post.objects.create(author=self.author, text='Свежая запись')
+        self.assertIsNone(cache.get(syndication._items_key(feed)))
+        self.assertContains(self.client.get(url), 'Свежая запись')
+
+    def test_stale_rebuild_not_cached(self):
+        """Перестроение, державшее блокировку дольше LOCK_WAIT, не прячет
+        пост, сохранённый за это время."""
+        post_item = syndication.post_item
+
+        def save_during_rebuild(post):
+            if not Post.objects.filter(text='Свежая запись').exists():
+                with self.on_commit, \
+                        mock.patch('posts.syndication.LOCK_WAIT', 0):
+                    Post.objects.create(author=self.author,
+                                        text='Свежая запись')
+            return post_item(post)
+
+        with mock.patch('posts.syndication.post_item',
+                        side_effect=save_during_rebuild):
+            items = syndication.feed_items('index', Post.objects.all())
+        self.assertEqual([item['text'] for item in items], [self.post.text])
+        items = syndication.feed_items('index', Post.objects.all())
+        self.assertEqual([item['text'] for item in items],
+                         ['Свежая запись', self.post.text])
+
+    def test_group_rename_resets_items(self):
+        """Переименование группы сбрасывает списки записей."""
+        url = reverse('posts:feed_index', args=['rss'])
+        self.client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Высшие вампиры'
+        group.save()
+        self.assertContains(self.client.get(url), 'Высшие вампиры')
+
+    def test_conditional_get(self):
+        """Повторный опрос неизменной ленты получает 304."""
+        url = reverse('posts:feed_group', args=['vampires', 'atom'])
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
@@ -0,0 +1,133 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+
+from posts.derivatives import supported_formats
+from posts.models import Post
+from posts.templatetags.post_images import post_sources, post_thumbnail
+from posts.thumbnails import attach_images, ready_thumbnail, thumbnail_file
+
+from .media import SMALL_GIF, TempMediaMixin
+
+User = get_user_model()
+
+
+class ThumbnailPipelineTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Lambert')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def create_post(self, text='С картинкой'):
+        uploaded = SimpleUploadedFile('small.gif', SMALL_GIF,
+                                      content_type='image/gif')
+        self.client.post(reverse('posts:post_create'),
+                         data={'text': text, 'image': uploaded})
+        return Post.objects.get(text=text)
+
+    def test_original_shown_until_thumbnail_ready(self):
+        """Пока миниатюры нет, страница показывает оригинал."""
+        post = self.create_post()
+        self.assertIsNone(ready_thumbnail(post.image, '960x339',
+                                          crop='center', upscale=True))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, post.image.url)
+
+    def test_failed_thumbnails_do_not_break_request(self):
+        """Ошибка нарезки после коммита пишется в журнал, а не в ответ."""
+        on_commit = mock.patch('posts.thumbnails.transaction.on_commit',
+                               lambda callback: callback())
+        failing = mock.patch('posts.thumbnails.generate_thumbnails.func',
+                             side_effect=OSError('Битый файл'))
+        with on_commit, failing, \
+                self.assertLogs('posts.thumbnails', 'ERROR') as logs:
+            post = self.create_post()
+        self.assertIn(str(post.pk), logs.output[0])
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_thumbnail_generated_on_save(self):
+        """Миниатюра режется при сохранении поста, а не при показе."""
+        post = self.create_post()
+        thumbnail = ready_thumbnail(post.image, '960x339',
+                                    crop='center', upscale=True)
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, thumbnail.url)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_thumbnail_name_matches_sorl(self):
+        """Имя миниатюры без нарезки совпадает с именем от sorl."""
+        post = self.create_post()
+        for geometry, options in settings.POST_THUMBNAIL_SIZES:
+            self.assertEqual(
+                thumbnail_file(post.image, geometry, **options).name,
+                get_thumbnail(post.image, geometry, **options).name)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_page_thumbnails_resolved_in_one_lookup(self):
+        """Картинки страницы ищутся пачкой, а не по одной на пост."""
+        for i in range(3):
+            self.create_post(f'Пост {i}')
+        Post.objects.create(author=self.user, text='Без картинки')
+        cache.clear()
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(0):
+            attach_images(posts)
+        # Один запрос за копиями и один за миниатюрами в таблице sorl
+        with self.assertNumQueries(2):
+            post_thumbnail(posts[-1])
+        with self.assertNumQueries(0):
+            [post_sources(post) for post in posts if post.image]
+        self.assertEqual(
+            sum(bool(post_thumbnail(post)) for post in posts if post.image),
+            3)
+        response = self.client.get(reverse('posts:index'))
+        for post in response.context['page_obj']:
+            if post.image:
+                self.assertContains(response, post.thumbnail.url)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_responsive_derivatives(self):
+        """Для картинки готовятся копии по ширинам и форматам."""
+        post = self.create_post()
+        formats = set(post.derivatives.values_list('format', flat=True))
+        self.assertIn('jpeg', formats)
+        self.assertLessEqual(formats, set(supported_formats()))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        derivative = post.derivatives.get(format='jpeg')
+        self.assertContains(response, f'{derivative.image.url} 480w')
+        self.assertContains(response, '<picture>')
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_derivative_files_removed(self):
+        """Файлы копий удаляются вместе с картинкой и с постом."""
+        # TestCase не коммитит транзакцию, поэтому файлы удаляются сразу
+        on_commit = mock.patch('posts.derivatives.transaction.on_commit',
+                               lambda callback: callback())
+        with on_commit:
+            post = self.create_post()
+            names = list(post.derivatives.values_list('image', flat=True))
+            self.assertTrue(names)
+            post.image = None
+            post.save()
+            self.assertFalse(post.derivatives.exists())
+            self.assertFalse(
+                any(default_storage.exists(name) for name in names))
+            post = self.create_post('Ещё картинка')
+            names = list(post.derivatives.values_list('image', flat=True))
+            post.delete()
+            self.assertFalse(
+                any(default_storage.exists(name) for name in names))
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts.models import Follow, Post, TimelineEntry
+from posts.timeline import timeline_posts
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='Dandelion')
+        cls.author = User.objects.create_user(username='Zoltan')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_post_lands_in_follower_timeline(self):
+        """Новый пост раскладывается по лентам подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новость')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(list(timeline_posts(self.reader)), [post])
+
+    def test_follow_backfills_and_unfollow_cleans(self):
+        """Подписка подтягивает старые посты, отписка их убирает."""
+        post = Post.objects.create(author=self.author, text='Старый пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(list(timeline_posts(self.reader)), [post])
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(list(timeline_posts(self.reader)), [])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_bounded(self):
+        """Лента подписчика не растёт больше TIMELINE_LENGTH."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(4):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты популярного автора не рассылаются, но видны в ленте."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Для всех')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(list(timeline_posts(self.reader)), [post])
+
+    def test_author_crossing_limit_keeps_old_posts(self):
+        """Смена статуса знаменитости не прячет уже опубликованные посты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with override_settings(TIMELINE_FANOUT_LIMIT=1):
+            celebrity_post = Post.objects.create(author=self.author,
+                                                 text='Для всех')
+        cache.clear()
+        post = Post.objects.create(author=self.author, text='Для своих')
+        self.assertTrue(Post.objects.get(pk=post.pk).fanned_out)
+        self.assertEqual(list(timeline_posts(self.reader)),
+                         [post, celebrity_post])
+        with override_settings(TIMELINE_FANOUT_LIMIT=1):
+            cache.clear()
+            self.assertEqual(list(timeline_posts(self.reader)),
+                             [post, celebrity_post])
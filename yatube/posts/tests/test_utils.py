@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Post
+from posts.utils import KeysetPage, KeysetPaginator
+
+User = get_user_model()
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Ciri')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
+        )
+        # Половина постов с одинаковой датой: порядок держится на id
+        now = timezone.now()
+        ids = list(Post.objects.values_list('pk', flat=True))
+        Post.objects.filter(pk__in=ids[:12]).update(pub_date=now)
+        Post.objects.filter(pk__in=ids[12:]).update(
+            pub_date=now - timedelta(days=1))
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_cover_feed_without_gaps(self):
+        """Курсоры проходят ленту целиком без повторов."""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        page = paginator.get_page(None)
+        seen = [post.pk for post in page]
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(post.pk for post in page)
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(page.has_next())
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор назад возвращает ту же предыдущую страницу."""
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_opens_first_page(self):
+        """Битый токен не ломает страницу."""
+        page = KeysetPaginator(Post.objects.all(), 10).get_page('%%%')
+        self.assertEqual([post.pk for post in page], self.expected[:10])
+
+    @override_settings(POST_KEYSET_PAGINATION=True)
+    def test_views_use_keyset_but_keep_page_links(self):
+        """Ленты переходят на курсоры, но ?page=N по-прежнему работает."""
+        url = reverse('posts:profile', kwargs={'username': 'Ciri'})
+        response = self.client.get(url)
+        self.assertIsInstance(response.context['page_obj'], KeysetPage)
+        self.assertContains(response, '?cursor=')
+        response = self.client.get(url + '?page=3')
+        self.assertIs(type(response.context['page_obj']), Page)
+        self.assertEqual(len(response.context['page_obj']), 5)
@@ -1,9 +1,10 @@
 import random
-import tempfile
-import shutil
+from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django import forms
@@ -11,28 +12,22 @@ from faker import Faker
 from django.conf import settings
 from django.core.cache import cache
 
-from posts.models import Group, Post, Follow
+from posts import cache as post_cache
+from posts.models import Comment, Group, Post, Follow
+
+from .media import SMALL_GIF, TempMediaMixin
 
 fake = Faker()
 User = get_user_model()
 
 
-class PostPagesTests(TestCase):
+class PostPagesTests(TempMediaMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
-        small_gif = (
-            b'\x47\x49\x46\x38\x39\x61\x02\x00'
-            b'\x01\x00\x80\x00\x00\x00\x00\x00'
-            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
-            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
-            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
-            b'\x0A\x00\x3B'
-        )
         uploaded = SimpleUploadedFile(
             name='small.gif',
-            content=small_gif,
+            content=SMALL_GIF,
             content_type='image/gif'
         )
         cls.user = User.objects.create_user(username='Witcher3')
@@ -48,11 +43,6 @@ class PostPagesTests(TestCase):
             image=uploaded
         )
 
-    @classmethod
-    def tearDownClass(cls):
-        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
-        super().tearDownClass()
-
     def setUp(self):
         self.authorized_client = Client()
         self.guest_client = Client()
@@ -196,18 +186,63 @@ class CacheTests(TestCase):
             text=fake.text(),
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_cache(self):
         """Тест кэширования главной страницы"""
         first_request = self.client.get(reverse('posts:index'))
-        post_1 = Post.objects.get(pk=1)
-        post_1.text = 'Мы изменили текст, без обид'
-        post_1.save()
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Мы изменили текст в обход сигналов')
         second_request = self.client.get(reverse('posts:index'))
         self.assertEqual(first_request.content, second_request.content)
         cache.clear()
         third_request = self.client.get(reverse('posts:index'))
         self.assertNotEqual(first_request.content, third_request.content)
 
+    def test_cache_invalidated_by_post_save(self):
+        """Сохранение поста сразу сбрасывает кэш главной страницы"""
+        first_request = self.client.get(reverse('posts:index'))
+        self.post.text = 'Мы изменили текст, без обид'
+        self.post.save()
+        second_request = self.client.get(reverse('posts:index'))
+        self.assertNotEqual(first_request.content, second_request.content)
+        self.assertContains(second_request, 'Мы изменили текст, без обид')
+
+    def test_cache_invalidated_by_comment(self):
+        """Новый комментарий меняет счётчик на закешированной странице"""
+        self.client.get(reverse('posts:index'))
+        Comment.objects.create(post=self.post, author=self.user, text='Хм')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_cache_bypassed_for_authorized_user(self):
+        """Авторизованный пользователь не получает гостевую страницу"""
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Избранные авторы')
+
+    @override_settings(POST_PAGE_CACHE_VIEWS=('index', 'profile'))
+    def test_cache_opt_in_for_profile(self):
+        """Кэш профиля включается настройкой"""
+        url = reverse('posts:profile', kwargs={'username': 'Geralt'})
+        first_request = self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Свежий текст')
+        second_request = self.client.get(url)
+        self.assertEqual(first_request.content, second_request.content)
+
+    @override_settings(POST_PAGE_CACHE_VIEWS=('index', 'profile'))
+    def test_cache_follows_feed_etag(self):
+        """Новый ETag профиля не отдаётся со старой разметкой"""
+        url = reverse('posts:profile', kwargs={'username': 'Geralt'})
+        first_request = self.client.get(url)
+        reader = User.objects.create_user(username='Ciri')
+        Follow.objects.create(user=reader, author=self.user)
+        second_request = self.client.get(url)
+        self.assertNotEqual(first_request['ETag'], second_request['ETag'])
+        self.assertContains(second_request, 'Подписчиков: 1')
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -276,6 +311,23 @@ class FollowTests(TestCase):
         post_text = response.context["page_obj"][0].text
         self.assertEqual(post_text, self.post.text)
 
+    @override_settings(TIMELINE_LENGTH=3, POST_PER_PAGE=2)
+    def test_subscription_feed_count_bounded(self):
+        """Число постов ленты подписок считается не дальше её длины."""
+        Follow.objects.create(user=self.user_follower,
+                              author=self.user_following)
+        for index in range(4):
+            Post.objects.create(author=self.user_following,
+                                text=f'Пост {index}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_auth_follower.get(
+                reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 3)
+        counts = [query['sql'] for query in queries.captured_queries
+                  if 'COUNT(' in query['sql']]
+        self.assertEqual(len(counts), 1)
+        self.assertIn('LIMIT 3', counts[0])
+
     def test_subscription_feed_not_follow(self):
         """Запись не появляется в ленте тех, кто не подписан."""
         Follow.objects.create(user=self.user_following,
@@ -294,3 +346,181 @@ class FollowTests(TestCase):
         follow_exist = Follow.objects.filter(user=self.user,
                                              author=self.user).exists()
         self.assertFalse(follow_exist)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Regis',
+                                            first_name='Эмиель')
+        cls.group = Group.objects.create(title='Вампиры', slug='vampires')
+        cls.post = Post.objects.create(author=cls.user, group=cls.group,
+                                       text='Текст карточки')
+        cls.url = reverse('posts:profile', kwargs={'username': 'Regis'})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_card_is_cached_until_post_changes(self):
+        """Карточка берётся из кеша, пока пост не сохранён заново."""
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо сигналов')
+        self.assertContains(self.client.get(self.url), 'Текст карточки')
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        self.assertContains(self.client.get(self.url), 'Мимо сигналов')
+
+    def test_card_follows_group_and_author_changes(self):
+        """Правка группы или автора сбрасывает кеш карточки."""
+        self.client.get(self.url)
+        self.group.slug = 'higher-vampires'
+        self.group.save()
+        self.assertContains(self.client.get(self.url), 'higher-vampires')
+        self.user.first_name = 'Регис'
+        self.user.save()
+        self.assertContains(self.client.get(self.url), 'Регис')
+
+    def test_owner_change_does_not_rewrite_posts(self):
+        """Правка автора сдвигает версию, а не дату изменения постов."""
+        updated = Post.objects.get(pk=self.post.pk).updated
+        self.user.first_name = 'Эмиель Регис'
+        self.user.save()
+        self.group.title = 'Высшие вампиры'
+        self.group.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).updated, updated)
+
+    def test_version_bump_not_overwritten(self):
+        """Сдвиг версии между чтением и заведением версий не теряется."""
+        key = f'posts:card_version:author:{self.user.pk}'
+        get_many = cache.get_many
+
+        def bump_after_read(keys):
+            found = get_many(keys)
+            if key not in found:
+                cache.set(key, 5, None)
+                post_cache.bump_card_version(f'author:{self.user.pk}')
+            return found
+
+        post = Post.objects.get(pk=self.post.pk)
+        with mock.patch.object(post_cache.cache, 'get_many',
+                               side_effect=bump_after_read):
+            post_cache.attach_card_versions([post])
+        self.assertEqual(cache.get(key), 6)
+        self.assertTrue(post.card_version.startswith('6.'))
+
+
+class PostDetailCommentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Zoltan')
+        cls.post = Post.objects.create(author=cls.user, text='Краснолюды')
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    def add_comments(self, count):
+        for index in range(count):
+            author = User.objects.create_user(
+                username=f'commenter{Comment.objects.count()}')
+            Comment.objects.create(post=self.post, author=author,
+                                   text=f'Комментарий {index}')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_comments(self):
+        """Число запросов не зависит от числа комментариев."""
+        self.add_comments(1)
+        self.client.get(self.url)
+        expected = self.count_queries()
+        self.add_comments(5)
+        self.assertEqual(self.count_queries(), expected)
+
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_comments_paginated(self):
+        """Комментарии выводятся страницами, свежие первыми."""
+        self.add_comments(3)
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['comments']), 2)
+        self.assertEqual(response.context['comments'][0].text,
+                         'Комментарий 2')
+        response = self.client.get(self.url, {'comments': 2})
+        self.assertEqual(len(response.context['comments']), 1)
+        self.assertEqual(response.context['comments'][0].text,
+                         'Комментарий 0')
+
+
+class ConditionalFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Yennefer')
+        cls.reader = User.objects.create_user(username='Triss')
+        cls.group = Group.objects.create(title='Чародейки', slug='sorceresses')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Портал в Венгерберг')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified_until_feed_changes(self):
+        """Неизменная лента отдаёт 304 без запроса страницы."""
+        url = reverse('posts:group_list', kwargs={'slug': 'sorceresses'})
+        response = self.client.get(url)
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Красиво')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_other_feeds_stay_unchanged(self):
+        """Подписка меняет только ленты профилей обоих пользователей."""
+        urls = [reverse('posts:index'),
+                reverse('posts:profile', kwargs={'username': 'Yennefer'})]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        Follow.objects.create(user=self.reader, author=self.author)
+        statuses = [self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+                    for url, etag in zip(urls, etags)]
+        self.assertEqual(statuses, [304, 200])
+
+    def test_last_modified(self):
+        """If-Modified-Since работает для клиентов без ETag."""
+        url = reverse('posts:index')
+        with mock.patch('posts.cache.time') as clock:
+            clock.time.return_value = 1000.5
+            post_cache.touch_feeds('all', 'index')
+            clock.time.return_value = 1002.0
+            response = self.client.get(url)
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified_within_same_second(self):
+        """Пока не прошла секунда правки, Last-Modified не отдаётся."""
+        url = reverse('posts:index')
+        with mock.patch('posts.cache.time') as clock:
+            clock.time.return_value = 1000.2
+            post_cache.touch_feeds('all', 'index')
+            clock.time.return_value = 1000.4
+            response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('ETag', response)
+
+    def test_cache_headers(self):
+        """Гостевые страницы публичные, страницы пользователя — private."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        guest_etag = response['ETag']
+        self.client.force_login(self.reader)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=guest_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
@@ -0,0 +1,169 @@
+"""Фоновая нарезка миниатюр картинок постов.
+
+Миниатюры всех размеров из POST_THUMBNAIL_SIZES и адаптивные копии
+готовятся задачей фоновой очереди после сохранения поста. Шаблоны не режут
+картинки сами: пока миниатюры нет в хранилище sorl, показывается оригинал.
+
+Имя миниатюры без нарезки и пакетное чтение хранилища cached_db опираются
+на внутренности sorl-thumbnail, поэтому версия пакета закреплена
+в requirements.txt. При обновлении sorl первыми упадут тесты
+test_thumbnails, сверяющие эти имена с результатом get_thumbnail.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDbKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.tasks import task
+
+from .cache import bump_feed_generation, post_feeds, touch_feeds
+from .derivatives import (attach_derivatives, generate_derivatives,
+                          normalize_original)
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_file(image, geometry, **options):
+    """ImageFile миниатюры с тем же именем, что выдаст get_thumbnail.
+
+    Повторяет ThumbnailBackend.get_thumbnail sorl-thumbnail 12.7 до нарезки.
+    """
+    backend = default.backend
+    source = ImageFile(image)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def card_size():
+    """Геометрия и опции миниатюры в карточке поста."""
+    geometry, options = settings.POST_THUMBNAIL_SIZES[0]
+    return geometry, dict(options)
+
+
+def ready_thumbnail(image, geometry, **options):
+    """Готовая миниатюра из хранилища sorl или None, без нарезки."""
+    if not image:
+        return None
+    return default.kvstore.get(thumbnail_file(image, geometry, **options))
+
+
+def ready_thumbnails(images, geometry, **options):
+    """Готовые миниатюры пачки картинок: {имя картинки: ImageFile}.
+
+    Для хранилища cached_db все ключи читаются одним get_many из кеша,
+    а промахи добираются одним запросом к таблице sorl.
+    """
+    thumbnails = {
+        image.name: thumbnail_file(image, geometry, **options)
+        for image in images if image
+    }
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDbKVStore):
+        found = {name: kvstore.get(thumbnail)
+                 for name, thumbnail in thumbnails.items()}
+        return {name: image for name, image in found.items() if image}
+    keys = {add_prefix(thumbnail.key): name
+            for name, thumbnail in thumbnails.items()}
+    values = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        fresh = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(fresh, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fresh)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in values.items()
+        if value and value != EMPTY_VALUE
+    }
+
+
+class PageImages:
+    """Картинки постов страницы, загружаемые при первом обращении.
+
+    Карточки из кеша фрагментов картинки не трогают, поэтому миниатюры
+    и копии читаются, только когда первая карточка рендерится заново,
+    и сразу для всех постов страницы.
+    """
+
+    def __init__(self, posts):
+        self.posts = [post for post in posts if post.image]
+        self.loaded = False
+
+    def load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        attach_derivatives(self.posts)
+        geometry, options = card_size()
+        thumbnails = ready_thumbnails(
+            (post.image for post in self.posts), geometry, **options)
+        for post in self.posts:
+            post.thumbnail = thumbnails.get(post.image.name, False)
+
+
+def attach_images(posts):
+    """Готовит картинки постов страницы для шаблона карточки.
+
+    Проставляет `page_images`: общий для страницы загрузчик миниатюр
+    (`thumbnail`, False — если не готова) и адаптивных копий.
+    """
+    page = PageImages(posts)
+    for post in page.posts:
+        post.page_images = page
+
+
+@task
+def generate_thumbnails(post_id):
+    """Чистит оригинал, режет миниатюры и сбрасывает кеш карточки поста."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    normalize_original(post)
+    for geometry, options in settings.POST_THUMBNAIL_SIZES:
+        get_thumbnail(post.image, geometry, **options)
+    generate_derivatives(post)
+    Post.objects.filter(pk=post_id).update(updated=timezone.now())
+    bump_feed_generation()
+    touch_feeds(*post_feeds(post.author_id, post.group_id))
+
+
+def schedule_thumbnails(post):
+    """Ставит нарезку миниатюр в очередь после коммита транзакции.
+
+    Без воркера (TASKS_EAGER) задача выполнится сразу после коммита,
+    а не посреди транзакции запроса. Ошибка нарезки пишется в журнал:
+    пост уже сохранён, и ответ не должен падать с 500.
+    """
+    if not post.image:
+        return
+    if not settings.THUMBNAIL_ASYNC:
+        generate_thumbnails(post.pk)
+        return
+    transaction.on_commit(lambda: _enqueue(post.pk))
+
+
+def _enqueue(post_id):
+    try:
+        generate_thumbnails.delay(post_id)
+    except Exception:
+        logger.exception('Не удалось нарезать миниатюры поста %s', post_id)
@@ -0,0 +1,176 @@
+"""Материализованная лента подписок.
+
+Новый пост сразу раскладывается по лентам подписчиков (fan-out on write).
+Посты авторов с огромным числом подписчиков не рассылаются, а
+подмешиваются при чтении ленты (fan-out on read). Решение запоминается
+в `Post.fanned_out`, поэтому автор, перешедший порог подписчиков в любую
+сторону, не теряет старые посты из лент.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Follow, Post, TimelineEntry
+
+
+def _followers_key(author_id):
+    return f'timeline:followers:{author_id}'
+
+
+def follower_counts(author_ids):
+    """Число подписчиков авторов; значения кешируются."""
+    keys = {_followers_key(author_id): author_id for author_id in author_ids}
+    counts = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = [author_id for author_id in author_ids
+               if author_id not in counts]
+    if missing:
+        fresh = dict.fromkeys(missing, 0)
+        fresh.update(
+            Follow.objects.filter(author_id__in=missing)
+            .values_list('author_id')
+            .annotate(followers=Count('pk'))
+        )
+        cache.set_many(
+            {_followers_key(author_id): value
+             for author_id, value in fresh.items()},
+            settings.TIMELINE_CELEBRITY_TTL
+        )
+        counts.update(fresh)
+    return counts
+
+
+def forget_follower_count(author_id):
+    cache.delete(_followers_key(author_id))
+
+
+def is_celebrity(author_id):
+    count = follower_counts([author_id])[author_id]
+    return count >= settings.TIMELINE_FANOUT_LIMIT
+
+
+def trim(user_ids):
+    """Обрезает ленты подписчиков до TIMELINE_LENGTH записей одним DELETE.
+
+    `user_ids` — список или queryset со значениями id пользователей.
+    """
+    ranked = TimelineEntry.objects.filter(user_id__in=user_ids).annotate(
+        position=Window(RowNumber(), partition_by=[F('user_id')],
+                        order_by=[F('pub_date').desc(), F('pk').desc()])
+    ).order_by().values('pk', 'position')
+    sql, params = ranked.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TimelineEntry._meta.db_table} WHERE id IN ('
+            f'SELECT id FROM ({sql}) ranked WHERE position > %s)',
+            [*params, settings.TIMELINE_LENGTH]
+        )
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    if post.fanned_out or is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id)
+    with transaction.atomic():
+        # Отметка ставится до чтения подписчиков: подписка, пришедшая
+        # посередине, сама подтянет пост в backfill
+        Post.objects.filter(pk=post.pk).update(fanned_out=True)
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, post=post,
+                           pub_date=post.pub_date)
+             for user_id in followers.values_list('user_id', flat=True)),
+            ignore_conflicts=True
+        )
+        trim(followers.values('user_id'))
+    post.fanned_out = True
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту свежими разосланными постами автора."""
+    posts = Post.objects.filter(
+        author_id=author_id, fanned_out=True).values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts),
+        ignore_conflicts=True
+    )
+    trim([user_id])
+
+
+def drop_author(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя.
+
+    Неразосланные посты (знаменитостей и ещё ждущие в очереди) берутся
+    у авторов подписок по частичному индексу post_unfanned_idx.
+    """
+    authors = Follow.objects.filter(user=user).values('author_id')
+    return Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author_id__in=authors, fanned_out=False)
+    )
+
+
+def timeline_count(user):
+    """Число постов ленты, но не больше TIMELINE_LENGTH.
+
+    Лента хранит столько записей на подписчика, дальше страницы не
+    листаются. COUNT идёт по подзапросу с LIMIT и без сортировки, поэтому
+    его цена не растёт с числом постов знаменитостей в подписках.
+    """
+    return timeline_posts(user).order_by().values('pk')[
+        :settings.TIMELINE_LENGTH].count()
+
+
+def rebuild_timelines(users=None, posts=None):
+    """Заполняет ленты заново одним INSERT.
+
+    Нужна после записи в обход сигналов. Посты знаменитостей помечаются
+    неразосланными, остальные разосланными, и каждому подписчику
+    достаются TIMELINE_LENGTH свежих разосланных постов его авторов.
+    `users` (queryset id) и `posts` ограничивают перестройку лентами этих
+    пользователей и отметками этих постов; тогда все подписчики авторов
+    `posts` должны входить в `users`.
+    """
+    followed = Follow.objects.all()
+    marked = Post.objects.all()
+    entries = TimelineEntry.objects.all()
+    if users is not None:
+        followed = followed.filter(user_id__in=users)
+        entries = entries.filter(user_id__in=users)
+    if posts is not None:
+        marked = posts
+    authors = Follow.objects.all()
+    if posts is not None:
+        authors = authors.filter(author_id__in=posts.values('author_id'))
+    celebrities = authors.values('author_id').annotate(
+        followers=Count('pk')).filter(
+        followers__gte=settings.TIMELINE_FANOUT_LIMIT).values('author_id')
+    marked.filter(author_id__in=celebrities).update(fanned_out=False)
+    marked.exclude(author_id__in=celebrities).update(fanned_out=True)
+    entries.delete()
+    follows_sql, follows_params = followed.order_by().values(
+        'user_id', 'author_id').query.sql_with_params()
+    posts_table = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, pub_date) '
+            f'SELECT user_id, post_id, pub_date FROM ('
+            f'SELECT f.user_id, p.id AS post_id, p.pub_date, ROW_NUMBER() '
+            f'OVER (PARTITION BY f.user_id '
+            f'ORDER BY p.pub_date DESC, p.id DESC) AS position '
+            f'FROM ({follows_sql}) f '
+            f'JOIN {posts_table} p ON p.author_id = f.author_id '
+            f'WHERE p.fanned_out = %s'
+            f') ranked WHERE position <= %s',
+            [*follows_params, True, settings.TIMELINE_LENGTH]
+        )
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, syndication, views
 
 
 app_name = 'posts'
@@ -13,6 +13,7 @@ urlpatterns = [
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -23,4 +24,16 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/v1/posts/', api.index, name='api_index'),
+    path('api/v1/posts/<int:post_id>/', api.post_detail, name='api_post'),
+    path('api/v1/groups/<slug:slug>/posts/', api.group_posts,
+         name='api_group'),
+    path('api/v1/profiles/<str:username>/posts/', api.profile,
+         name='api_profile'),
+    path('api/v1/follow/posts/', api.follow_index, name='api_follow'),
+    path('feeds/<str:format>/', syndication.index, name='feed_index'),
+    path('feeds/group/<slug:slug>/<str:format>/', syndication.group_posts,
+         name='feed_group'),
+    path('feeds/profile/<str:username>/<str:format>/', syndication.profile,
+         name='feed_profile'),
 ]
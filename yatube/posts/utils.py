@@ -1,9 +1,125 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+
+from django.core.paginator import Paginator, Page
 from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+def encode_cursor(direction, post):
+    """Упаковывает позицию поста (pub_date, id) в непрозрачный токен."""
+    raw = f'{direction}|{post.pub_date.isoformat()}|{post.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, pub_date, id) или None для битого токена."""
+    if not cursor:
+        return None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class KeysetPage(Page):
+    """Страница курсорной пагинации.
+
+    Совместима с шаблонами по `has_next`/`has_previous`, но вместо номеров
+    страниц отдаёт токены `next_cursor`/`previous_cursor`.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Keyset page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(CURSOR_NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(CURSOR_PREVIOUS, self.object_list[0])
+
+
+class KeysetPaginator(Paginator):
+    """Пагинация по ключу (pub_date, id) без COUNT(*) и OFFSET."""
+
+    def get_page(self, cursor):
+        position = decode_cursor(cursor)
+        queryset = self.object_list.order_by('-pub_date', '-pk')
+        limit = self.per_page + 1
+        if position is None:
+            posts = list(queryset[:limit])
+            return KeysetPage(posts[:self.per_page], self,
+                              has_next=len(posts) > self.per_page,
+                              has_previous=False)
+        direction, pub_date, pk = position
+        # Лишнее условие на pub_date даёт СУБД диапазон по индексу даты:
+        # по одному OR она умеет только просматривать индекс целиком
+        if direction == CURSOR_NEXT:
+            posts = list(queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk),
+                pub_date__lte=pub_date
+            )[:limit])
+            return KeysetPage(posts[:self.per_page], self,
+                              has_next=len(posts) > self.per_page,
+                              has_previous=True)
+        posts = list(queryset.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk),
+            pub_date__gte=pub_date
+        ).reverse()[:limit])
+        return KeysetPage(posts[:self.per_page][::-1], self,
+                          has_next=True,
+                          has_previous=len(posts) > self.per_page)
+
+
+class CountedPaginator(Paginator):
+    """Paginator с заранее известным числом объектов (без COUNT(*))."""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        if self._known_count is None:
+            return super().count
+        return self._known_count
 
 
-def get_paginator_obj(request, posts):
-    paginator = Paginator(posts, settings.POST_PER_PAGE)
+def get_paginator_obj(request, posts, count=None):
+    if settings.POST_KEYSET_PAGINATION and 'page' not in request.GET:
+        paginator = KeysetPaginator(posts, settings.POST_PER_PAGE)
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = CountedPaginator(posts, settings.POST_PER_PAGE, count=count)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
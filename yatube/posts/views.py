@@ -1,28 +1,45 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.conf import settings
 from django.urls import reverse
-from django.views.decorators.cache import cache_page
 
 from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
-from .utils import get_paginator_obj
+from .cache import (attach_card_versions, author_feeds, cache_feed_page,
+                    conditional_feed, group_feeds)
+from .utils import CountedPaginator, get_paginator_obj
+from .counters import post_count, user_profile
+from .search import search_post_ids
+from .timeline import timeline_count, timeline_posts
+from .thumbnails import attach_images, schedule_thumbnails
 
 
-@cache_page(settings.TIME_CACHE)
+@conditional_feed(lambda request: ['index'])
+@cache_feed_page('index')
 def index(request):
     post_list = Post.objects.select_related('author', 'group')
-    page_obj = get_paginator_obj(request, post_list)
+    page_obj = get_paginator_obj(request, post_list, count=post_count())
+    attach_images(page_obj)
+    attach_card_versions(page_obj)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_feed(group_feeds)
+@cache_feed_page('group_posts')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
-    page_obj = get_paginator_obj(request, posts)
+    page_obj = get_paginator_obj(request, posts,
+                                 count=post_count(group=group))
+    attach_images(page_obj)
+    attach_card_versions(page_obj)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -30,16 +47,24 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_feed(author_feeds)
+@cache_feed_page('profile')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    user_posts = author.posts.select_related('group')
-    page_obj = get_paginator_obj(request, user_posts)
+    author = get_object_or_404(User.objects.select_related('profile'),
+                               username=username)
+    user_posts = author.posts.select_related('author', 'group')
+    posts_count = post_count(author=author)
+    page_obj = get_paginator_obj(request, user_posts, count=posts_count)
+    attach_images(page_obj)
+    attach_card_versions(page_obj)
     following = request.user.is_authenticated and (
         Follow.objects.filter(
             user=request.user, author=author).exists()
     )
     context = {
         'author': author,
+        'posts_count': posts_count,
+        'profile': user_profile(author),
         'page_obj': page_obj,
         'following': following,
     }
@@ -47,17 +72,42 @@ def profile(request, username):
 
 
 def post_detail(request, post_id):
-    user_post = get_object_or_404(Post, id=post_id)
+    user_post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id)
     form = CommentForm(request.POST or None)
-    comments = user_post.comments.all()
+    comments = CountedPaginator(
+        user_post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        count=user_post.comments_count
+    ).get_page(request.GET.get('comments'))
     context = {
         'user_post': user_post,
+        'author_posts_count': post_count(author=user_post.author),
         'form': form,
         'comments': comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    post_ids = search_post_ids(query) if query else []
+    page_obj = Paginator(post_ids, settings.POST_PER_PAGE).get_page(
+        request.GET.get('page'))
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        page_obj.object_list)
+    page_obj.object_list = [posts[pk] for pk in page_obj.object_list
+                            if pk in posts]
+    attach_images(page_obj)
+    attach_card_versions(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -66,6 +116,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        schedule_thumbnails(post)
 
         return redirect('posts:profile', post.author.username)
 
@@ -86,7 +137,9 @@ def post_edit(request, post_id):
                     instance=post
                     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            schedule_thumbnails(post)
         return redirect('posts:post_detail', post_id)
 
     context = {
@@ -105,14 +158,20 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        # Счётчик комментариев сдвигается сигналом в той же транзакции;
+        # внутри чужой транзакции точка сохранения не нужна
+        with transaction.atomic(savepoint=False):
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_paginator_obj(request, post_list)
+    post_list = timeline_posts(request.user).select_related('author', 'group')
+    page_obj = get_paginator_obj(request, post_list,
+                                 count=timeline_count(request.user))
+    attach_images(page_obj)
+    attach_card_versions(page_obj)
     context = {
         'page_obj': page_obj,
     }
@@ -122,15 +181,17 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     user = request.user
-    author = User.objects.get(username=username)
-    is_follower = Follow.objects.filter(user=user, author=author)
-    if user != author and not is_follower:
-        Follow.objects.get_or_create(user=user, author=author)
+    author = get_object_or_404(User, username=username)
+    if user != author:
+        # Подписка и сдвиг счётчиков в сигнале — одна транзакция
+        with transaction.atomic(savepoint=False):
+            Follow.objects.get_or_create(user=user, author=author)
     return redirect(reverse('posts:profile', args=[username]))
 
 
 @login_required
 def profile_unfollow(request, username):
-    is_follower = Follow.objects.filter(author__username=username)
-    is_follower.delete()
+    author = get_object_or_404(User, username=username)
+    with transaction.atomic(savepoint=False):
+        Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username)
@@ -52,11 +52,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -67,7 +69,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templates.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,6 +96,27 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
+# Реплики для чтения лент: YATUBE_DB_REPLICAS — пути к файлам SQLite через
+# запятую, локально их наполняет команда sync_replicas. В тестах реплики
+# смотрят в тестовую базу default.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.getenv('YATUBE_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DATABASE_REPLICA_VIEWS = ('posts:index', 'posts:group_list', 'posts:profile',
+                          'posts:post_detail', 'posts:follow_index',
+                          'posts:api_index', 'posts:api_group',
+                          'posts:api_profile', 'posts:api_post',
+                          'posts:api_follow')
+# Сколько секунд после своей записи пользователь читает основную базу
+DATABASE_REPLICA_STICKY_SECONDS = 10
+DATABASE_REPLICA_STICKY_COOKIE = 'db_primary_until'
 
 
 # Password validation
@@ -137,22 +160,159 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+DEFAULT_FROM_EMAIL = os.getenv('YATUBE_FROM_EMAIL', 'noreply@yatube.ru')
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 PASSWORD_RESET_FORM = 'users:password_reset'
 PASSWORD_RESET_DONE = 'users:password_reset_done'
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 POST_PER_PAGE = 10
+# Комментарии под постом выводятся страницами по ?comments=N
+COMMENTS_PER_PAGE = 50
+# Бэкенд полнотекстового поиска и сколько лучших постов он отдаёт
+POST_SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+POST_SEARCH_LIMIT = 1000
+# Atom/RSS: сколько записей в ленте и сколько хранится их список в кеше
+SYNDICATION_ITEMS = 20
+SYNDICATION_TIMEOUT = 24 * 60 * 60
+# Курсорная пагинация лент вместо OFFSET; ссылки ?page=N продолжают работать
+POST_KEYSET_PAGINATION = False
+# С какого размера таблицы общий счётчик постов берётся из статистики СУБД
+POST_COUNT_APPROXIMATE_FROM = 1000000
+# Лента подписок: сколько постов хранить на подписчика и с какого числа
+# подписчиков посты автора не рассылаются, а подмешиваются при чтении
+TIMELINE_LENGTH = 1000
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_CELEBRITY_TTL = 300
+# Метрики запросов: заголовок Server-Timing, доля запросов в логе,
+# порог медленного запроса в мс и как часто итоги уходят в общий кеш
+PERFORMANCE_SERVER_TIMING = True
+PERFORMANCE_LOG_SAMPLE_RATE = float(
+    os.getenv('YATUBE_PERFORMANCE_SAMPLE_RATE', '0.01'))
+PERFORMANCE_SLOW_MS = 500
+PERFORMANCE_FLUSH_SECONDS = 10
+PERFORMANCE_STATS_TTL = 24 * 60 * 60
+# Отпечатки SQL: чьи запросы считать, порог журнала медленных запросов
+# в мс, сколько кадров стека приложений писать в журнал и сколько кадров
+# от запроса вверх просматривать в их поисках
+QUERY_STATS_APPS = ('posts', 'users', 'core')
+QUERY_SLOW_MS = 100
+QUERY_STACK_DEPTH = 5
+QUERY_STACK_WALK = 64
+# Фоновая очередь: без воркера (YATUBE_TASKS_EAGER=1, по умолчанию при DEBUG
+# и в тестах) задачи выполняются сразу; иначе нужен manage.py run_tasks.
+# Повторы с задержкой TASK_RETRY_DELAY * 2^n секунд, зависшая задача
+# возвращается в очередь через TASK_VISIBILITY_TIMEOUT секунд
+TASKS_EAGER = os.getenv('YATUBE_TASKS_EAGER', '1' if DEBUG else '0') == '1'
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_DELAY = 10
+TASK_VISIBILITY_TIMEOUT = 10 * 60
+TASK_KEEP_DONE = 24 * 60 * 60
+# Дайджесты подписчикам: окно первого запуска, отступ от текущего момента
+# для ещё не закоммиченных постов, срок, после которого незавершённый
+# запуск считается упавшим, постов в письме, писем на пачку SMTP
+DIGEST_INTERVAL = 24 * 60 * 60
+DIGEST_LAG = 60
+DIGEST_RUN_TIMEOUT = 60 * 60
+DIGEST_MAX_POSTS = 20
+DIGEST_BATCH_SIZE = 100
+DIGEST_SITE_URL = os.getenv('YATUBE_SITE_URL', 'http://127.0.0.1:8000')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-TIME_CACHE = 20
-
+# Размеры миниатюр, которые заранее режутся в фоне после сохранения поста
+POST_THUMBNAIL_SIZES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Адаптивные копии для srcset: ширины, форматы по убыванию приоритета
+POST_IMAGE_WIDTHS = (480, 960, 1920)
+POST_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+POST_IMAGE_ASPECT_RATIO = 960 / 339
+POST_IMAGE_QUALITY = 80
+# Загрузки картинок: сразу во временный файл, проверка по заголовку,
+# слишком большие оригиналы уменьшаются в фоне, метаданные вырезаются
+FILE_UPLOAD_HANDLERS = [
+    'core.uploadhandlers.LimitedTemporaryFileUploadHandler',
+]
+FILE_UPLOAD_MAX_REQUEST_SIZE = 25 * 2 ** 20
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40000000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Миниатюры режет задача фоновой очереди; False — прямо в запросе
+THUMBNAIL_ASYNC = True
+# Кеш страниц лент для гостей сбрасывается сигналами, поэтому TTL долгий
+TIME_CACHE = 60 * 60
+POST_PAGE_CACHE_VIEWS = ('index',)
+
+# Общий кеш для всех воркеров: SQLite-файл локально, Redis на проде
+# (YATUBE_CACHE=redis и REDIS_URL, нужен пакет django-redis)
+CACHE_BACKENDS = {
+    'sqlite': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'COMPRESS_MIN_LENGTH': 1024,
+        },
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+# MeteredCache считает попадания и промахи для метрик любого бэкенда
+CACHE_BACKEND = CACHE_BACKENDS[os.getenv('YATUBE_CACHE', 'sqlite')]
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        **CACHE_BACKEND,
+        'BACKEND': 'core.cache.MeteredCache',
+        'METERED_BACKEND': CACHE_BACKEND['BACKEND'],
+        'KEY_PREFIX': 'yatube',
     }
 }
+# Тесты работают с кешем в памяти, а не с общим файлом разработчика
+# (manage.py test — через TEST_RUNNER, pytest — через tests/conftest.py)
+TEST_RUNNER = 'core.test_runner.TestRunner'
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.MeteredCache',
+        'METERED_BACKEND': CACHE_BACKENDS['locmem']['BACKEND'],
+        'KEY_PREFIX': 'yatube',
+    },
+}
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('YATUBE_PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'yatube.sql': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'yatube.tasks': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -27,6 +27,7 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('', include('core.urls', namespace='core')),
     path('', include('posts.urls', namespace='posts')),
 ]
 if settings.DEBUG: